@@ -3,19 +3,37 @@
 #----------------------------------------------------------------------------#
 
 import json
+import itertools
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
+from flask import Flask, render_template, stream_template, stream_with_context, request, Response, flash, redirect, url_for, abort, jsonify
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
+from sqlalchemy import Date, String, cast, func, true, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import contains_eager, load_only, undefer_group
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
-from datetime import datetime, date
-from models import Artist, Venue, Shows
+from datetime import date, timedelta
+from models import DETAILS, Artist, Venue, Shows, Recommendation
 from config import db, SQLALCHEMY_DATABASE_URI
+from query_budget import init_query_budget, query_budget
+from show_counts import add_show_counts, start_of_today
+from commands import fyyur_cli
+from page_cache import init_page_cache, cached_page, invalidate_page
+from log_pipeline import init_logging
+from name_index import NameIndex
+from replica import init_replica, use_replica
+from assets import init_assets
+from recommendations import refresh_artist, refresh_venues
+from feeds import feed_etag, ical_feed, json_feed
+from deletes import DELETES
+from search import (LIKE_ESCAPE, SEARCHED, contains_pattern, search_documents,
+                    update_search_documents)
+from availability import available
+from partitions import EXCLUSION_VIOLATION
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -30,6 +48,19 @@ db.init_app(app)  # link to sqlalchemy database api
 
 # connect to a local postgresql database
 migrate = Migrate(app, db)
+# log requests which exceed their query budget
+init_query_budget(app)
+# keep reads on the primary right after a client's writes
+init_replica(app)
+# register the `flask fyyur` maintenance commands
+app.cli.add_command(fyyur_cli)
+# cache rendered venue/artist pages
+init_page_cache(app)
+# serve fingerprinted, precompressed static assets once built
+init_assets(app)
+# venue/artist names served by /autocomplete, built now
+name_index = NameIndex(app.config['AUTOCOMPLETE_REFRESH_INTERVAL'])
+name_index.start(app)
 
 
 # ----------------------------------------------------------------------------#
@@ -48,6 +79,134 @@ def format_datetime(value, format='medium'):
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+
+def genre_filter(model, genres):
+    # rows whose genres contain every selected genre (@>, GIN indexed)
+    return model.genres.contains(genres) if genres else true()
+
+
+def genre_facets(model, genres):
+    # count each genre across the rows matching the selected genres,
+    # in a single unnest ... GROUP BY query
+    row_genres = db.session.query(
+        func.unnest(model.genres).label('genre')
+    ).filter(genre_filter(model, genres)).subquery()
+    counts = db.session.query(
+        row_genres.c.genre, func.count().label('count')
+    ).group_by(row_genres.c.genre).order_by(
+        func.count().desc(), row_genres.c.genre).all()
+    facets = []
+    for genre, count in counts:
+        # link toggling the genre in or out of the selection
+        selected = genre in genres
+        toggled = [g for g in genres if g != genre] if selected else genres + [genre]
+        facets.append({
+            "genre": genre,
+            "count": count,
+            "selected": selected,
+            "genres": toggled
+        })
+    return facets
+
+
+def count_shows_by_date(criterion, today):
+    # return (upcoming, past) show counts matching criterion in one query
+    return db.session.query(
+        func.count(Shows.id).filter(Shows.start_time >= today),
+        func.count(Shows.id).filter(Shows.start_time < today)
+    ).filter(criterion).one()
+
+
+def paginate_shows(query, page):
+    # return a single page of an ordered shows query
+    per_page = app.config['SHOWS_PER_PAGE']
+    return query.limit(per_page).offset((max(page, 1) - 1) * per_page).all()
+
+
+def page_links(page, total, per_page=None):
+    # previous/next page numbers for a paginated list, of shows by default
+    per_page = per_page or app.config['SHOWS_PER_PAGE']
+    return {
+        "page": page,
+        "prev": page - 1 if page > 1 else None,
+        "next": page + 1 if page * per_page < total else None
+    }
+
+
+def bulk_delete_ids():
+    # the ids of a bulk delete, sent as a {"ids": [...]} JSON body
+    body = request.get_json(silent=True)
+    ids = body.get('ids') if isinstance(body, dict) else None
+    if (not isinstance(ids, list) or not ids
+            or len(ids) > app.config['BULK_DELETE_MAX_IDS']
+            or not all(type(entity_id) is int for entity_id in ids)):
+        abort(400)
+    return ids
+
+
+def delete_listings(kind, ids):
+    # delete venues or artists with set-based statements (see deletes.py)
+    # and drop them from the page cache and name index. Returns the ids
+    # deleted, or None when the transaction failed
+    try:
+        deleted, changed = DELETES[kind](ids, start_of_today())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return None
+    finally:
+        db.session.close()
+    for prefix, entity_ids in changed.items():
+        invalidate_page(prefix, *entity_ids)
+    for entity_id in deleted:
+        name_index.remove(kind, entity_id)
+    return deleted
+
+
+def show_feed(model, key, entity_id, feed_format):
+    # upcoming shows of a venue or artist as an iCal or JSON feed, streamed
+    # from a server-side cursor. The ETag is checked before the shows are
+    # queried, so polling an unchanged feed costs one primary key lookup
+    details = [model.name]
+    if model is Venue:
+        # the venue's address is the location of each of its shows
+        details += [Venue.address, Venue.city, Venue.state]
+    entity = db.session.query(model.shows_changed_at, *details).filter(
+        model.id == entity_id).first()
+    if entity is None:
+        abort(404)
+    today = start_of_today()
+    etag = feed_etag(model.__tablename__, entity_id, entity[1:],
+                     entity.shows_changed_at, today.date())
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        shows = db.session.query(
+            Shows.id,
+            Shows.start_time,
+            Shows.venue_id,
+            Venue.name.label('venue_name'),
+            Venue.address.label('venue_address'),
+            Venue.city.label('venue_city'),
+            Venue.state.label('venue_state'),
+            Shows.artist_id,
+            Artist.name.label('artist_name')
+        ).select_from(Shows).join(Venue).join(Artist).filter(
+            key == entity_id, Shows.start_time >= today
+        ).order_by(Shows.start_time, Shows.id).yield_per(
+            app.config['SHOWS_STREAM_BATCH_SIZE'])
+        if feed_format == 'ics':
+            response = Response(stream_with_context(ical_feed(
+                entity.name, shows, entity.shows_changed_at)),
+                mimetype='text/calendar')
+        else:
+            response = Response(stream_with_context(json_feed(shows)),
+                                mimetype='application/json')
+    response.set_etag(etag)
+    # clients revalidate on every poll
+    response.cache_control.no_cache = True
+    return response
+
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
@@ -62,53 +221,75 @@ def index():
 #  ----------------------------------------------------------------
 
 @ app.route('/venues')
+@ use_replica
+@ query_budget(2)
 def venues():
+    # optionally narrow the venues to those having every ?genre=
+    genres = request.args.getlist('genre')
+    # read the denormalized counters, ordered so areas are contiguous
+    rows = db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.upcoming_shows_count
+    ).filter(genre_filter(Venue, genres)).order_by(
+        Venue.state, Venue.city, Venue.id).all()
 
     data = []
-    places = Venue.query.distinct(Venue.city, Venue.state)
-    for place in places:  # iterate over each state
-        # get filtered table of venues in state
-        state_venues = Venue.query.filter_by(
-            state=place.state).distinct().all()
-        state_venues_list = []
-        # for each venue in the state venues, pull relevant data
-        for venue in state_venues:
-            num_upcoming_shows = Shows.query.filter_by(
-                venue_id=venue.id).count()
-            venues = {
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": num_upcoming_shows
-            }
-            # append all venue dictionaries to fill the list
-            state_venues_list.append(venues)
-        # append all data
+    # group venues by city and state in a single pass
+    for (city, state), area_venues in itertools.groupby(
+            rows, key=lambda row: (row.city, row.state)):
         data.append({
-            "city": place.city,
-            "state": place.state,
-            "venues": state_venues_list
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue_id,
+                "name": name,
+                "num_upcoming_shows": num_upcoming_shows
+            } for venue_id, name, _, _, num_upcoming_shows in area_venues]
         })
 
-    return render_template('pages/venues.html', areas=data)
+    return render_template('pages/venues.html', areas=data, genres=genres,
+                           facets=genre_facets(Venue, genres))
+
+
+def name_search(model, search_term):
+    # up to SEARCH_RESULTS_LIMIT rows of model whose name contains
+    # search_term, best trigram similarity first, and their count. Rather
+    # than counting every match, one extra row is read to tell whether the
+    # count is 'N+'. Terms too short to have a trigram cannot use the index
+    # and would rank most names, so their matches come in id order instead,
+    # reading rows only until the limit is reached
+    limit = app.config['SEARCH_RESULTS_LIMIT']
+    if len(search_term) < app.config['SEARCH_RANKED_TERM_LENGTH']:
+        order = [model.id]
+    else:
+        order = [func.similarity(model.name, search_term).desc(), model.id]
+    rows = db.session.query(
+        model.id, model.name, model.upcoming_shows_count
+    ).filter(model.name.ilike(contains_pattern(search_term),
+                              escape=LIKE_ESCAPE)).order_by(
+        *order).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], f'{limit}+'
+    return rows, len(rows)
 
 
 @ app.route('/venues/search', methods=['POST'])
+@ use_replica
+@ query_budget(1)
 def search_venues():
     # case insensitive search
-    search_term = request.form.get('search_term', '')
-    venues = Venue.query.filter(Venue.name.ilike(f'%{search_term}%'))
-    data = []
-    # iterate over filtered venues and add properties to data list
-    for venue in venues:
-        num_upcoming_shows = Shows.query.filter(
-            Shows.venue_id == venue.id).count()
-        data.append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": num_upcoming_shows
-        })
+    search_term = request.form.get('search_term', '').strip()
+    venues, count = name_search(Venue, search_term)
+    data = [{
+        "id": venue.id,
+        "name": venue.name,
+        "num_upcoming_shows": venue.upcoming_shows_count
+    } for venue in venues]
     response = {
-        "count": len(data),
+        "count": count,
         "data": data
     }
 
@@ -116,32 +297,51 @@ def search_venues():
 
 
 @ app.route('/venues/<int:venue_id>')
+@ cached_page('venue', 'venue_id')
+@ use_replica
+@ query_budget(5)
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    venue = Venue.query.get(venue_id)
-    # join Shows and Artist table, filter Shows table on venue id
-    shows_artist = Shows.query.join(Artist).filter(
-        Shows.venue_id == venue_id)
-    # calculate and format todays date to split shows into past/future
-    today = datetime.now()
-    today = date(today.year, today.month, today.day)
-    past_shows, upcoming_shows = [], []
-    # separate data by date
-    for show_artist in shows_artist:
-        if show_artist.start_time < today:
-            past_shows.append({
-                "artist_id": show_artist.artist.id,
-                "artist_name": show_artist.artist.name,
-                "artist_image_link": show_artist.artist.image_link,
-                "start_time": str(show_artist.start_time)
-            })
-        else:
-            upcoming_shows.append({
-                "artist_id": show_artist.artist.id,
-                "artist_name": show_artist.artist.name,
-                "artist_image_link": show_artist.artist.image_link,
-                "start_time": str(show_artist.start_time)
-            })
+    # the page shows every column, including the deferred ones
+    venue = Venue.query.options(undefer_group(DETAILS)).get_or_404(venue_id)
+    today = start_of_today()
+    upcoming_page = request.args.get('upcoming_page', 1, type=int)
+    past_page = request.args.get('past_page', 1, type=int)
+    # count past/upcoming shows in one query
+    upcoming_shows_count, past_shows_count = count_shows_by_date(
+        Shows.venue_id == venue_id, today)
+    # join Shows and Artist table, loading the artist columns in the same statement
+    shows_artist = Shows.query.join(Shows.artist).options(
+        contains_eager(Shows.artist).load_only(
+            Artist.id, Artist.name, Artist.image_link)
+    ).filter(Shows.venue_id == venue_id)
+    # split shows by date in SQL, one page of each
+    upcoming_shows = [{
+        "artist_id": show_artist.artist.id,
+        "artist_name": show_artist.artist.name,
+        "artist_image_link": show_artist.artist.image_link,
+        "start_time": str(show_artist.start_time)
+    } for show_artist in paginate_shows(
+        shows_artist.filter(Shows.start_time >= today).order_by(
+            Shows.start_time, Shows.id), upcoming_page)]
+    past_shows = [{
+        "artist_id": show_artist.artist.id,
+        "artist_name": show_artist.artist.name,
+        "artist_image_link": show_artist.artist.image_link,
+        "start_time": str(show_artist.start_time)
+    } for show_artist in paginate_shows(
+        shows_artist.filter(Shows.start_time < today).order_by(
+            Shows.start_time.desc(), Shows.id.desc()), past_page)]
+    # artists that fit this venue, precomputed by recommendations.py
+    recommended_artists = [{
+        "artist_id": artist.id,
+        "artist_name": artist.name,
+        "artist_image_link": artist.image_link,
+    } for artist in db.session.query(
+        Artist.id, Artist.name, Artist.image_link
+    ).join(Recommendation, Recommendation.artist_id == Artist.id).filter(
+        Recommendation.venue_id == venue_id
+    ).order_by(Recommendation.score.desc(), Artist.id)]
 
     data = {
         "id": venue.id,
@@ -158,12 +358,80 @@ def show_venue(venue_id):
         "image_link": venue.image_link,
         "past_shows": past_shows,
         "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
+        "past_shows_count": past_shows_count,
+        "upcoming_shows_count": upcoming_shows_count,
+        "past_pages": page_links(past_page, past_shows_count),
+        "upcoming_pages": page_links(upcoming_page, upcoming_shows_count),
+        "recommended_artists": recommended_artists,
     }
 
     return render_template('pages/show_venue.html', venue=data)
 
+
+@ app.route('/venues/<int:venue_id>/shows.<any(ics, json):feed_format>')
+@ use_replica
+@ query_budget(1)
+def venue_feed(venue_id, feed_format):
+    # upcoming shows at the venue, for calendar apps and promoters
+    return show_feed(Venue, Shows.venue_id, venue_id, feed_format)
+
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+
+@ app.route('/autocomplete')
+def autocomplete():
+    # venue and artist names starting with ?q=, served from memory
+    limit = min(request.args.get('limit', app.config['AUTOCOMPLETE_LIMIT'], type=int),
+                app.config['AUTOCOMPLETE_LIMIT'])
+    matches = name_index.search(request.args.get('q', ''), limit,
+                                kind=request.args.get('type'))
+    return jsonify({
+        'success': True,
+        'results': [{
+            "type": kind,
+            "id": entity_id,
+            "name": name,
+            "url": url_for('show_' + kind, **{kind + '_id': entity_id})
+        } for kind, entity_id, name in matches]
+    })
+
+#  Search
+#  ----------------------------------------------------------------
+
+
+@ app.route('/search')
+@ use_replica
+@ query_budget(1)
+def search():
+    # venues and artists matching ?q= by name, city, state, genre or
+    # upcoming show date, ranked in one query on SearchDocument
+    search_term = request.args.get('q', '').strip()
+    kind = request.args.get('type') or None
+    if kind is not None and kind not in SEARCHED:
+        abort(400)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = app.config['SEARCH_PER_PAGE']
+    rows = search_documents(search_term, page, per_page, kind) if search_term else []
+    # the matches are not counted: one row past the page tells whether
+    # there is a next one
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    data = [{
+        "type": row.kind,
+        "id": row.entity_id,
+        "name": row.name,
+        "city": row.city,
+        "state": row.state,
+        "genres": row.genres,
+        "next_show": str(row.next_show) if row.next_show else None,
+        "url": url_for('show_' + row.kind, **{row.kind + '_id': row.entity_id})
+    } for row in rows]
+    seen = (page - 1) * per_page + len(rows)
+    return render_template('pages/search.html', search_term=search_term, type=kind,
+                           results={"count": f'{seen}+' if more else seen, "data": data},
+                           pages=page_links(page, seen + more, per_page))
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -175,6 +443,7 @@ def create_venue_form():
 
 
 @ app.route('/venues/create', methods=['POST'])
+@ query_budget(12)
 def create_venue_submission():
     error = False
     try:
@@ -192,7 +461,11 @@ def create_venue_submission():
             seeking_description=request.form.get('seeking_description')
         )
         db.session.add(venue)
+        db.session.flush()
+        refresh_venues([venue.id])
+        update_search_documents(start_of_today(), venue_ids=[venue.id])
         db.session.commit()
+        name_index.add('venue', venue.id, venue.name)
     except Exception:
         error = True
         db.session.rollback()
@@ -210,36 +483,43 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@ app.route('/venues/<venue_id>', methods=['DELETE'])
+@ app.route('/venues/<int:venue_id>', methods=['DELETE'])
+@ query_budget(6)
 def delete_venue(venue_id):
-    # Delete a record. Handle cases where the session commit could fail.
-    error = False
-    try:
-        Venue.query.get(venue_id).delete()
-        db.session.commit()
-    except Exception:
-        error = True
-        db.session.rollback()
-    finally:
-        db.session.close()
-        if error:
-            # flash error
-            flash('Venue ' + venue_id + ' could not be deleted.')
-        else:
-            # flash success
-            flash('Venue ' + venue_id + ' was deleted successfully.')
-
-    return jsonify({'success': True})
+    # delete the venue with its shows. Handle cases where the session
+    # commit could fail
+    deleted = delete_listings('venue', [venue_id])
+    if deleted is None:
+        flash(f'Venue {venue_id} could not be deleted.')
+    elif not deleted:
+        abort(404)
+    else:
+        flash(f'Venue {venue_id} was deleted successfully.')
+    return jsonify({'success': deleted is not None})
+
+
+@ app.route('/venues', methods=['DELETE'])
+@ query_budget(6)
+def delete_venues():
+    # delete every venue of a {"ids": [...]} body in one transaction
+    deleted = delete_listings('venue', bulk_delete_ids())
+    if deleted is None:
+        return jsonify({'success': False}), 500
+    return jsonify({'success': True, 'deleted': deleted})
 
 #  Artists
 #  ----------------------------------------------------------------
 
 
 @ app.route('/artists')
+@ use_replica
+@ query_budget(2)
 def artists():
-    # show all artist id and names
+    # show all artist id and names, optionally narrowed by ?genre=
+    genres = request.args.getlist('genre')
     data = []
-    artists = Artist.query.all()
+    artists = db.session.query(Artist.id, Artist.name).filter(
+        genre_filter(Artist, genres)).order_by(Artist.id)
     for artist in artists:
         data.append(
             {
@@ -248,60 +528,65 @@ def artists():
             }
         )
 
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=data, genres=genres,
+                           facets=genre_facets(Artist, genres))
 
 
 @ app.route('/artists/search', methods=['POST'])
+@ use_replica
+@ query_budget(1)
 def search_artists():
     # case insensitive search
-    search_term = request.form.get('search_term')
-    artists = Artist.query.filter(Artist.name.ilike(f'%{search_term}%'))
-    data = []
-    today = datetime.now()
-    # iterate over all artists and append data
-    for artist in artists:
-        filter_criteria = [Shows.artist_id == artist.id,
-                           Shows.start_time > today]
-        data.append({
-            "id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": Shows.query.filter(*filter_criteria).count()
-        })
-
+    search_term = request.form.get('search_term', '').strip()
+    artists, count = name_search(Artist, search_term)
+    data = [{
+        "id": artist.id,
+        "name": artist.name,
+        "num_upcoming_shows": artist.upcoming_shows_count
+    } for artist in artists]
     response = {
-        "count": artists.count(),
+        "count": count,
         "data": data
     }
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 
 @ app.route('/artists/<int:artist_id>')
+@ cached_page('artist', 'artist_id')
+@ use_replica
+@ query_budget(4)
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
-    artist = Artist.query.get(artist_id)
-    # join shows and venue tables, filter by artist id
-    shows_venues = Shows.query.join(Venue).filter(
-        Shows.artist_id == artist_id)
-    # calculate and format todays date to split shows into past/future
-    today = datetime.now()
-    today = date(today.year, today.month, today.day)
-    past_shows, upcoming_shows = [], []
-    # split shows by time
-    for show_venue in shows_venues:
-        if show_venue.start_time < today:
-            past_shows.append({
-                "venue_id": show_venue.venue.id,
-                "venue_name": show_venue.venue.name,
-                "venue_image_link": show_venue.venue.image_link,
-                "start_time": str(show_venue.start_time)
-            })
-        else:
-            upcoming_shows.append({
-                "venue_id": show_venue.venue.id,
-                "venue_name": show_venue.venue.name,
-                "venue_image_link": show_venue.venue.image_link,
-                "start_time": str(show_venue.start_time)
-            })
+    # the page shows every column, including the deferred ones
+    artist = Artist.query.options(undefer_group(DETAILS)).get_or_404(artist_id)
+    today = start_of_today()
+    upcoming_page = request.args.get('upcoming_page', 1, type=int)
+    past_page = request.args.get('past_page', 1, type=int)
+    # count past/upcoming shows in one query
+    upcoming_shows_count, past_shows_count = count_shows_by_date(
+        Shows.artist_id == artist_id, today)
+    # join shows and venue tables, loading the venue columns in the same statement
+    shows_venues = Shows.query.join(Shows.venue).options(
+        contains_eager(Shows.venue).load_only(
+            Venue.id, Venue.name, Venue.image_link)
+    ).filter(Shows.artist_id == artist_id)
+    # split shows by date in SQL, one page of each
+    upcoming_shows = [{
+        "venue_id": show_venue.venue.id,
+        "venue_name": show_venue.venue.name,
+        "venue_image_link": show_venue.venue.image_link,
+        "start_time": str(show_venue.start_time)
+    } for show_venue in paginate_shows(
+        shows_venues.filter(Shows.start_time >= today).order_by(
+            Shows.start_time, Shows.id), upcoming_page)]
+    past_shows = [{
+        "venue_id": show_venue.venue.id,
+        "venue_name": show_venue.venue.name,
+        "venue_image_link": show_venue.venue.image_link,
+        "start_time": str(show_venue.start_time)
+    } for show_venue in paginate_shows(
+        shows_venues.filter(Shows.start_time < today).order_by(
+            Shows.start_time.desc(), Shows.id.desc()), past_page)]
 
     data = {
         "id": artist.id,
@@ -318,12 +603,47 @@ def show_artist(artist_id):
         "image_link": artist.image_link,
         "past_shows": past_shows,
         "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
+        "past_shows_count": past_shows_count,
+        "upcoming_shows_count": upcoming_shows_count,
+        "past_pages": page_links(past_page, past_shows_count),
+        "upcoming_pages": page_links(upcoming_page, upcoming_shows_count),
     }
 
     return render_template('pages/show_artist.html', artist=data)
 
+
+@ app.route('/artists/<int:artist_id>/shows.<any(ics, json):feed_format>')
+@ use_replica
+@ query_budget(1)
+def artist_feed(artist_id, feed_format):
+    # upcoming shows of the artist, for calendar apps and promoters
+    return show_feed(Artist, Shows.artist_id, artist_id, feed_format)
+
+
+@ app.route('/artists/<int:artist_id>', methods=['DELETE'])
+@ query_budget(12)
+def delete_artist(artist_id):
+    # delete the artist with its shows. Handle cases where the session
+    # commit could fail
+    deleted = delete_listings('artist', [artist_id])
+    if deleted is None:
+        flash(f'Artist {artist_id} could not be deleted.')
+    elif not deleted:
+        abort(404)
+    else:
+        flash(f'Artist {artist_id} was deleted successfully.')
+    return jsonify({'success': deleted is not None})
+
+
+@ app.route('/artists', methods=['DELETE'])
+@ query_budget(12)
+def delete_artists():
+    # delete every artist of a {"ids": [...]} body in one transaction
+    deleted = delete_listings('artist', bulk_delete_ids())
+    if deleted is None:
+        return jsonify({'success': False}), 500
+    return jsonify({'success': True, 'deleted': deleted})
+
 #  Update
 #  ----------------------------------------------------------------
 
@@ -331,30 +651,24 @@ def show_artist(artist_id):
 @ app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     form = ArtistForm()
-    # get and return artist data
-    artist = Artist.query.get(artist_id)
+    # the form only names the artist, so only its id and name are read
+    artist = db.session.query(Artist.id, Artist.name).filter(
+        Artist.id == artist_id).first_or_404()
     data = {
         "id": artist.id,
-        "name": artist.name,
-        "genres": artist.genres,
-        "city": artist.city,
-        "state": artist.state,
-        "phone": artist.phone,
-        "website": artist.website,
-        "facebook_link": artist.facebook_link,
-        "seeking_venue": artist.seeking_venue,
-        "seeking_description": artist.seeking_description,
-        "image_link": artist.image_link
+        "name": artist.name
     }
 
     return render_template('forms/edit_artist.html', form=form, artist=data)
 
 
 @ app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@ query_budget(16)
 def edit_artist_submission(artist_id):
     # artist record with ID <artist_id> using the new attributes
     try:
-        artist = Artist.query.get(artist_id)
+        # only written to, so no column besides the key is read
+        artist = Artist.query.options(load_only(Artist.id)).get(artist_id)
         artist.name = request.form.get('name')
         artist.genres = request.form.getlist('genres')
         artist.city = request.form.get('city')
@@ -366,7 +680,13 @@ def edit_artist_submission(artist_id):
             'seeking_venue') == 'y' else False
         artist.seeking_description = request.form.get('seeking_description')
         artist.image_link = request.form.get('image_link')
+        db.session.flush()
+        recommended_at = refresh_artist(artist_id)
+        update_search_documents(start_of_today(), artist_ids=[artist_id])
         db.session.commit()
+        invalidate_page('artist', artist_id)
+        invalidate_page('venue', *recommended_at)
+        name_index.rename('artist', artist_id, artist.name)
     except Exception:
         db.session.rollback()
     finally:
@@ -377,31 +697,24 @@ def edit_artist_submission(artist_id):
 @ app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     form = VenueForm()
-    # get and return venue data
-    venue = Venue.query.get(venue_id)
+    # the form only names the venue, so only its id and name are read
+    venue = db.session.query(Venue.id, Venue.name).filter(
+        Venue.id == venue_id).first_or_404()
     data = {
         "id": venue.id,
-        "name": venue.name,
-        "genres": venue.genres,
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.seeking_talent,
-        "seeking_description": venue.seeking_description,
-        "image_link": venue.image_link
+        "name": venue.name
     }
 
     return render_template('forms/edit_venue.html', form=form, venue=data)
 
 
 @ app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@ query_budget(12)
 def edit_venue_submission(venue_id):
     # venue record with ID <venue_id> using the new attributes
     try:
-        venue = Venue.query.get(venue_id)
+        # only written to, so no column besides the key is read
+        venue = Venue.query.options(load_only(Venue.id)).get(venue_id)
         venue.name = request.form.get('name')
         venue.genres = request.form.getlist('genres')
         venue.city = request.form.get('city')
@@ -413,7 +726,12 @@ def edit_venue_submission(venue_id):
             'seeking_talent') == 'y' else False
         venue.seeking_description = request.form.get('seeking_description')
         venue.image_link = request.form.get('image_link')
+        db.session.flush()
+        refresh_venues([venue_id])
+        update_search_documents(start_of_today(), venue_ids=[venue_id])
         db.session.commit()
+        invalidate_page('venue', venue_id)
+        name_index.rename('venue', venue_id, venue.name)
     except Exception:
         db.session.rollback()
     finally:
@@ -432,6 +750,7 @@ def create_artist_form():
 
 
 @ app.route('/artists/create', methods=['POST'])
+@ query_budget(16)
 def create_artist_submission():
     # called upon submitting the new artist listing form
     error = False
@@ -452,7 +771,12 @@ def create_artist_submission():
             facebook_link=request.form.get('facebook_link')
         )
         db.session.add(artist)
+        db.session.flush()
+        recommended_at = refresh_artist(artist.id)
+        update_search_documents(start_of_today(), artist_ids=[artist.id])
         db.session.commit()
+        invalidate_page('venue', *recommended_at)
+        name_index.add('artist', artist.id, artist.name)
     except Exception:
         error = True
         db.session.rollback()
@@ -474,21 +798,157 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @ app.route('/shows')
+@ use_replica
+@ query_budget(1)
 def shows():
     # displays list of shows at /shows
-    all_shows = Shows.query.join(Artist).join(Venue)
-    data = []
-    for show in all_shows:
-        data.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": str(show.start_time)
-        })
+    all_shows = db.session.query(
+        Shows.id,
+        Shows.venue_id,
+        Venue.name.label('venue_name'),
+        Shows.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Shows.start_time
+    ).select_from(Shows).join(Artist).join(Venue).filter(
+        Shows.start_time.isnot(None)).order_by(Shows.start_time, Shows.id)
+
+    if request.args.get('stream', type=int):
+        # render every show incrementally from a server-side cursor
+        rows = all_shows.yield_per(app.config['SHOWS_STREAM_BATCH_SIZE'])
+        return Response(stream_template(
+            'pages/shows.html', shows=(format_show(row) for row in rows),
+            next_cursor=None))
+
+    # keyset pagination on (start_time, id), continuing after the cursor
+    cursor = request.args.get('after')
+    if cursor:
+        try:
+            start_time, show_id = cursor.rsplit('_', 1)
+            all_shows = all_shows.filter(tuple_(Shows.start_time, Shows.id) > (
+                dateutil.parser.isoparse(start_time), int(show_id)))
+        except ValueError:
+            abort(400)
+    per_page = app.config['SHOWS_LISTING_PER_PAGE']
+    # fetch one extra row to know whether there is a next page
+    rows = all_shows.limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = f'{rows[-1].start_time.isoformat()}_{rows[-1].id}'
+
+    return render_template('pages/shows.html', shows=[format_show(row) for row in rows],
+                           next_cursor=next_cursor)
+
+
+def format_show(row):
+    # format a joined show row for the shows listing
+    return {
+        "venue_id": row.venue_id,
+        "venue_name": row.venue_name,
+        "artist_id": row.artist_id,
+        "artist_name": row.artist_name,
+        "artist_image_link": row.artist_image_link,
+        "start_time": str(row.start_time)
+    }
 
-    return render_template('pages/shows.html', shows=data)
+
+def calendar_range():
+    # parse the ?start=&end= dates (inclusive, default this month) and the
+    # optional ?city=&state= filters of the calendar routes
+    today = date.today()
+    try:
+        start = date.fromisoformat(request.args.get(
+            'start', today.replace(day=1).isoformat()))
+        end = date.fromisoformat(request.args['end']) if 'end' in request.args else (
+            start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    except ValueError:
+        abort(400)
+    if end < start or (end - start).days >= app.config['CALENDAR_MAX_DAYS']:
+        abort(400)
+    return start, end, request.args.get('city'), request.args.get('state')
+
+
+def calendar_days(start, end, city, state):
+    # shows between start and end, bucketed per day in a single query
+    day = cast(Shows.start_time, Date).label('day')
+    shows = func.json_agg(aggregate_order_by(func.json_build_object(
+        'venue_id', Venue.id,
+        'venue_name', Venue.name,
+        'artist_id', Artist.id,
+        'artist_name', Artist.name,
+        'artist_image_link', Artist.image_link,
+        'start_time', cast(Shows.start_time, String)
+    ), Shows.start_time, Shows.id))
+    query = db.session.query(day, func.count(Shows.id), shows).select_from(
+        Shows).join(Venue).join(Artist).filter(
+        Shows.start_time >= start, Shows.start_time < end + timedelta(days=1))
+    if city:
+        query = query.filter(Venue.city == city)
+    if state:
+        query = query.filter(Venue.state == state)
+    return [{
+        "date": day.isoformat(),
+        "count": count,
+        "shows": day_shows
+    } for day, count, day_shows in query.group_by(day).order_by(day)]
+
+
+@ app.route('/shows/calendar')
+@ use_replica
+@ query_budget(1)
+def shows_calendar():
+    # calendar of shows per day, filtered by city/state
+    start, end, city, state = calendar_range()
+    return render_template('pages/calendar.html', start=start, end=end, city=city,
+                           state=state, days=calendar_days(start, end, city, state))
+
+
+@ app.route('/shows/calendar.json')
+@ use_replica
+@ query_budget(1)
+def shows_calendar_json():
+    # JSON version of the calendar
+    start, end, city, state = calendar_range()
+    return jsonify({
+        'success': True,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': calendar_days(start, end, city, state)
+    })
+
+
+def availability_query():
+    # parse ?date= (default today) and the optional ?city=&state= filters
+    # of the availability routes
+    try:
+        day = date.fromisoformat(request.args.get('date', date.today().isoformat()))
+    except ValueError:
+        abort(400)
+    return day, request.args.get('city'), request.args.get('state')
+
+
+@ app.route('/availability')
+@ use_replica
+@ query_budget(2)
+def availability():
+    # venues and artists, filtered by city/state, with no show on ?date=
+    day, city, state = availability_query()
+    return render_template('pages/availability.html', day=day, city=city, state=state,
+                           **available(day, city, state, app.config['AVAILABILITY_LIMIT']))
+
+
+@ app.route('/availability.json')
+@ use_replica
+@ query_budget(2)
+def availability_json():
+    # JSON version of the availability page
+    day, city, state = availability_query()
+    return jsonify({
+        'success': True,
+        'date': day.isoformat(),
+        **available(day, city, state, app.config['AVAILABILITY_LIMIT'])
+    })
 
 
 @ app.route('/shows/create')
@@ -501,23 +961,41 @@ def create_shows():
 @ app.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
-    error = False
+    error = None
     try:
         show = Shows(
             artist_id=request.form.get('artist_id'),
             venue_id=request.form.get('venue_id'),
-            start_time=request.form.get('start_time')
+            start_time=dateutil.parser.parse(
+                request.form.get('start_time')).astimezone()
         )
         db.session.add(show)
+        # update the venue and artist counters and search documents in
+        # the same transaction
+        today = start_of_today()
+        add_show_counts(show, today)
+        update_search_documents(today, venue_ids=[show.venue_id],
+                                artist_ids=[show.artist_id])
         db.session.commit()
+        invalidate_page('venue', show.venue_id)
+        invalidate_page('artist', show.artist_id)
+    except IntegrityError as e:
+        db.session.rollback()
+        # the booking constraints of the Shows partitions, and the trigger
+        # covering month boundaries, reject the insert itself, so two
+        # concurrent submissions cannot both succeed
+        if e.orig.pgcode == EXCLUSION_VIOLATION:
+            error = 'The venue or the artist already has a show at that time.'
+        else:
+            error = 'An error occurred.'
     except Exception:
-        error = True
+        error = 'An error occurred.'
         db.session.rollback()
     finally:
         db.session.close()
         if error:
             # on unsuccessful db insert, flash an error
-            flash('An error occurred. Show could not be listed.')
+            flash(error + ' Show could not be listed.')
         else:
             # on successful db insert, flash success
             flash('Show was successfully listed!')
@@ -535,14 +1013,8 @@ def server_error(error):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+    # error.log and the JSON lines request log are written off the request thread
+    init_logging(app)
     app.logger.info('errors')
 
 #----------------------------------------------------------------------------#
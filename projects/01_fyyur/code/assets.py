@@ -0,0 +1,202 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli variants are only built when it is installed
+    brotli = None
+
+# ----------------------------------------------------------------------------#
+# Fingerprinted, precompressed static assets.
+# ----------------------------------------------------------------------------#
+
+# output folder inside static/, and the manifest mapping source paths to it
+BUILD_DIR = 'build'
+MANIFEST = 'manifest.json'
+
+# text formats worth compressing; woff, jpg and png already are compressed
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.eot', '.ttf', '.otf', '.html'}
+
+# precompressed variants in order of preference: encoding, file suffix
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def minify_css(css):
+    # drop comments and redundant whitespace
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    # drop comments, indentation, repeated spaces and blank lines, keeping
+    # string and template literals as they are. Line breaks are kept, as
+    # automatic semicolon insertion may depend on them. Regex literals
+    # must not contain quotes, or // and /* other than as \/
+    out, i, length = [], 0, len(js)
+
+    def newline():
+        while out and out[-1] in (' ', '\t'):
+            out.pop()
+        if out and out[-1] != '\n':
+            out.append('\n')
+
+    while i < length:
+        char = js[i]
+        if char in '\'"`':
+            # copy the literal up to its unescaped closing quote
+            end = i + 1
+            while end < length and js[end] != char:
+                end += 2 if js[end] == '\\' else 1
+            out.append(js[i:end + 1])
+            i = end + 1
+        elif char == '\\':
+            # escaped character of a regex literal, such as \/
+            out.append(js[i:i + 2])
+            i += 2
+        elif js.startswith('//', i):
+            end = js.find('\n', i)
+            i = length if end == -1 else end
+        elif js.startswith('/*', i):
+            end = js.find('*/', i + 2)
+            end = length if end == -1 else end + 2
+            if '\n' in js[i:end]:
+                newline()
+            i = end
+        elif char in '\r\n':
+            newline()
+            i += 1
+        elif char in ' \t' and (not out or out[-1] in (' ', '\t', '\n')):
+            i += 1
+        else:
+            out.append(char)
+            i += 1
+    newline()
+    return ''.join(out).strip()
+
+
+def rewrite_css_urls(css, path, manifest):
+    # point url() references at the fingerprinted files
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        quote, url = match.groups()
+        # keep query strings and fragments, as in font urls like x.eot?#iefix
+        target, sep, suffix = (re.split(r'([?#])', url, maxsplit=1) + ['', ''])[:3]
+        source = posixpath.normpath(posixpath.join(directory, target))
+        if source not in manifest:
+            return match.group(0)
+        built = posixpath.relpath(manifest[source], posixpath.dirname(manifest[path]))
+        return f'url({quote}{built}{sep}{suffix}{quote})'
+
+    return CSS_URL.sub(replace, css)
+
+
+def fingerprint(path, content):
+    # css/main.css -> build/css/main.<hash>.css
+    root, ext = posixpath.splitext(path)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return posixpath.join(BUILD_DIR, f'{root}.{digest}{ext}')
+
+
+def write_asset(static_folder, built, content):
+    # write the asset with its gzip and brotli variants
+    target = os.path.join(static_folder, *built.split('/'))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(content)
+    if posixpath.splitext(built)[1] in COMPRESSIBLE:
+        with open(target + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(target + '.br', 'wb') as f:
+                f.write(brotli.compress(content))
+
+
+def build_assets(static_folder):
+    # fingerprint, minify and precompress every file under static_folder,
+    # returning the manifest of source path -> built path
+    sources = []
+    for directory, dirs, files in os.walk(static_folder):
+        relative = os.path.relpath(directory, static_folder).replace(os.sep, '/')
+        if relative == BUILD_DIR or relative.startswith(BUILD_DIR + '/'):
+            continue
+        for name in files:
+            if not name.startswith('.'):
+                sources.append(posixpath.normpath(posixpath.join(relative, name)))
+    # stylesheets last, so the files they reference are already fingerprinted
+    sources.sort(key=lambda path: (path.endswith('.css'), path))
+
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, *path.split('/')), 'rb') as f:
+            content = f.read()
+        if path.endswith('.css'):
+            css = content.decode('utf-8')
+            if not path.endswith('.min.css'):
+                css = minify_css(css)
+            # the built path is needed to make references relative to it
+            manifest[path] = fingerprint(path, css.encode('utf-8'))
+            css = rewrite_css_urls(css, path, manifest)
+            content = css.encode('utf-8')
+        elif path.endswith('.js') and not path.endswith('.min.js'):
+            content = minify_js(content.decode('utf-8')).encode('utf-8')
+        manifest[path] = fingerprint(path, content)
+        write_asset(static_folder, manifest[path], content)
+
+    with open(os.path.join(static_folder, BUILD_DIR, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def init_assets(app):
+    # serve fingerprinted assets when a build exists. url_for('static', ...)
+    # then emits fingerprinted URLs, and built files are sent precompressed
+    # with far-future immutable caching
+    manifest_path = os.path.join(app.static_folder, BUILD_DIR, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except OSError:
+        return
+    built = set(manifest.values())
+    max_age = app.config['ASSET_MAX_AGE']
+
+    @app.url_defaults
+    def fingerprinted_static(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def static(filename):
+        if filename not in built:
+            return app.send_static_file(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        accepted = request.accept_encodings
+        for encoding, suffix in ENCODINGS:
+            path = safe_join(app.static_folder, filename + suffix)
+            if accepted[encoding] and path and os.path.isfile(path):
+                response = send_from_directory(
+                    app.static_folder, filename + suffix,
+                    mimetype=mimetype, max_age=max_age)
+                response.content_encoding = encoding
+                # name the file as requested, not as stored
+                response.headers.pop('Content-Disposition', None)
+                break
+        else:
+            response = send_from_directory(
+                app.static_folder, filename, mimetype=mimetype, max_age=max_age)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
@@ -0,0 +1,54 @@
+from datetime import timedelta
+from sqlalchemy import exists, func
+from config import db
+from models import SHOW_DURATION, Artist, Venue, Shows
+from show_counts import start_of_day
+
+# ----------------------------------------------------------------------------#
+# Venues and artists free on a given day.
+# ----------------------------------------------------------------------------#
+
+# each model with the Shows column referencing it
+BOOKABLE = {
+    'venues': (Venue, Shows.venue_id),
+    'artists': (Artist, Shows.artist_id),
+}
+
+
+def booked(model, key, start, end):
+    # whether the row of model has a show overlapping [start, end). Shows
+    # last at most SHOW_DURATION, which bounds start_time on both sides,
+    # pruning the partitions and reading a short (entity, start_time) range
+    return exists().where(
+        key == model.id,
+        Shows.start_time < end,
+        Shows.start_time > start - SHOW_DURATION,
+        Shows.end_time > start)
+
+
+def available(day, city, state, limit):
+    # venues and artists, optionally in city/state, with no show on day,
+    # each found with one anti-join and returned as
+    # {'venues': {'count': n, 'data': [...]}, 'artists': {...}}, name first
+    start, end = start_of_day(day), start_of_day(day + timedelta(days=1))
+    results = {}
+    for kind, (model, key) in BOOKABLE.items():
+        query = db.session.query(
+            model.id, model.name, model.city, model.state,
+            func.count().over().label('total')
+        ).filter(~booked(model, key, start, end))
+        if city:
+            query = query.filter(model.city == city)
+        if state:
+            query = query.filter(model.state == state)
+        rows = query.order_by(model.name, model.id).limit(limit).all()
+        results[kind] = {
+            'count': rows[0].total if rows else 0,
+            'data': [{
+                'id': row.id,
+                'name': row.name,
+                'city': row.city,
+                'state': row.state
+            } for row in rows]
+        }
+    return results
@@ -0,0 +1,220 @@
+import contextvars
+import math
+import random
+import re
+import resource
+import statistics
+import time
+import tracemalloc
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from config import db
+from models import Artist, Venue, Shows
+
+# ----------------------------------------------------------------------------#
+# Route benchmark, driven through app.test_client().
+# ----------------------------------------------------------------------------#
+
+# extra query strings, form data or URL values other than ids per endpoint,
+# each benchmarked as its own case. Endpoints not listed are requested once
+# with no arguments
+CASES = {
+    'venues': [{}, {'query_string': {'genre': 'Jazz'}}],
+    'artists': [{}, {'query_string': {'genre': 'Jazz'}}],
+    'search_venues': [{'data': {'search_term': 'blue'}}],
+    'search_artists': [{'data': {'search_term': 'fox'}}],
+    'show_venue': [{}, {'query_string': {'past_page': 2}}],
+    'show_artist': [{}, {'query_string': {'past_page': 2}}],
+    'autocomplete': [{'query_string': {'q': 'the'}}],
+    'search': [{'query_string': {'q': 'blue'}}],
+    # ?stream=1 is left out, it renders every show in the database
+    'shows': [{}],
+    'shows_calendar': [{}],
+    'shows_calendar_json': [{}],
+    'availability': [{}, {'query_string': {'city': 'Austin'}}],
+    'venue_feed': [{'values': {'feed_format': 'ics'}},
+                   {'values': {'feed_format': 'json'}}],
+    'artist_feed': [{'values': {'feed_format': 'ics'}},
+                    {'values': {'feed_format': 'json'}}],
+}
+
+# POST endpoints that only read, and so are safe to repeat
+READ_ONLY_POSTS = {'search_venues', 'search_artists'}
+
+# never benchmarked
+SKIPPED = {'static'}
+
+# requests per route whose fetched bytes and ORM objects are measured. Each
+# of their SELECTs is run a second time to size its rows, so they are kept
+# apart from the timed requests
+MEASURED_REQUESTS = 10
+
+# measured statements; SELECT ... FOR UPDATE and writes are not re-run
+SELECT_STATEMENT = re.compile(r'\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+
+def percentile(samples, p):
+    # nearest-rank percentile of a sorted list
+    return samples[max(math.ceil(p / 100 * len(samples)) - 1, 0)]
+
+
+def targets(app):
+    # (name, rule, method, client arguments) of every read route of the app
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint in SKIPPED:
+            continue
+        if 'GET' in rule.methods:
+            method = 'get'
+        elif 'POST' in rule.methods and rule.endpoint in READ_ONLY_POSTS:
+            method = 'post'
+        else:
+            continue
+        for case in CASES.get(rule.endpoint, [{}]):
+            name = f'{method.upper()} {rule.rule}'
+            if case:
+                extra = (case.get('query_string') or case.get('data')
+                         or case.get('values'))
+                name += ' ' + '&'.join(f'{k}={v}' for k, v in extra.items())
+            yield name, rule, method, case
+
+
+class QueryCounter:
+    # counts statements sent to any engine while active
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, 'before_cursor_execute', self)
+
+
+class FetchCounter:
+    # SELECT statements sent to any engine and ORM objects loaded while active
+    def __init__(self):
+        self.statements = []
+        self.objects = 0
+
+    def statement(self, conn, cursor, statement, parameters, context, executemany):
+        if (not executemany and SELECT_STATEMENT.match(statement)
+                and 'FOR UPDATE' not in statement.upper()):
+            self.statements.append((statement, parameters))
+
+    def load(self, target, context):
+        self.objects += 1
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self.statement)
+        event.listen(db.Model, 'load', self.load, propagate=True)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, 'before_cursor_execute', self.statement)
+        event.remove(db.Model, 'load', self.load)
+
+    def fetched_bytes(self):
+        # size of every row the statements returned, as Postgres stores them
+        with db.engine.connect() as conn:
+            return sum(conn.exec_driver_sql(
+                'SELECT coalesce(sum(pg_column_size(fetched.*)), 0) '
+                f'FROM ({statement}) AS fetched', parameters).scalar()
+                for statement, parameters in self.statements)
+
+
+def run_benchmark(app, requests, seed):
+    # request every route `requests` times with seeded random ids and return
+    # latency percentiles, queries per request, the peak memory traced
+    # during a request and the bytes and ORM objects fetched per request,
+    # per route. Runs in an empty context: requests made while an app
+    # context is active, as in CLI commands, would share its g
+    return contextvars.Context().run(benchmark_routes, app, requests, seed)
+
+
+def benchmark_routes(app, requests, seed):
+    rng = random.Random(seed)
+    with app.app_context():
+        rows = {model.__tablename__: db.session.query(func.count(model.id)).scalar()
+                for model in (Venue, Artist, Shows)}
+        id_ranges = {
+            'venue_id': db.session.query(func.min(Venue.id), func.max(Venue.id)).one(),
+            'artist_id': db.session.query(func.min(Artist.id), func.max(Artist.id)).one(),
+        }
+        db.session.remove()
+
+    client = app.test_client()
+    results, skipped = {}, []
+    for name, rule, method, case in targets(app):
+        case = dict(case)
+        fixed = case.pop('values', {})
+        ids = rule.arguments - fixed.keys()
+        if any(id_ranges.get(arg, (None, None))[0] is None for arg in ids):
+            skipped.append(name)
+            continue
+
+        def request():
+            values = {arg: rng.randint(*id_ranges[arg]) for arg in ids}
+            path = rule.build({**values, **fixed}, append_unknown=False)[1]
+            response = getattr(client, method)(path, **case)
+            # drain streamed responses inside the timing
+            response.get_data()
+            response.close()
+            return response.status_code
+
+        request()  # warm up caches, the name index and the connection pool
+        timings, statuses = [], set()
+        with QueryCounter() as queries:
+            for _ in range(requests):
+                started = time.perf_counter()
+                statuses.add(request())
+                timings.append((time.perf_counter() - started) * 1000)
+        # traced separately, tracemalloc slows the request down
+        tracemalloc.start()
+        request()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        with FetchCounter() as fetched:
+            for _ in range(MEASURED_REQUESTS):
+                request()
+        with app.app_context():
+            fetched_bytes = fetched.fetched_bytes()
+
+        timings.sort()
+        results[name] = {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'queries_per_request': round(queries.count / requests, 2),
+            'peak_memory_kb': round(peak / 1024),
+            'bytes_per_request': round(fetched_bytes / MEASURED_REQUESTS),
+            'orm_objects_per_request': round(fetched.objects / MEASURED_REQUESTS, 2),
+            'statuses': sorted(statuses),
+        }
+
+    return {
+        'seed': seed,
+        'requests_per_route': requests,
+        'rows': rows,
+        'page_cache': app.config['PAGE_CACHE_TYPE'],
+        # peak resident memory of the whole run, kilobytes on Linux
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'routes': results,
+        'skipped': skipped,
+    }
+
+
+def compare(baseline, results, fields):
+    # (route, field, before, after) for every field of the routes in both
+    # benchmark results, e.g. one from before a change and one from after
+    for name, route in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            continue
+        for field in fields:
+            if field in before:
+                yield name, field, before[field], route[field]
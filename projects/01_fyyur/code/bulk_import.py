@@ -0,0 +1,187 @@
+import csv
+import json
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from wtforms import BooleanField, DateTimeField, SelectField, SelectMultipleField
+from wtforms.fields.core import UnboundField
+from wtforms.validators import DataRequired, StopValidation, ValidationError
+from config import db
+from forms import ArtistForm, ShowForm, VenueForm
+from models import Artist, Venue, Shows
+from partitions import EXCLUSION_VIOLATION
+
+# ----------------------------------------------------------------------------#
+# Bulk import of venues, artists and shows.
+# ----------------------------------------------------------------------------#
+
+# form used to validate each kind of row, with the model it is inserted into
+IMPORTS = {
+    'venues': (VenueForm, Venue),
+    'artists': (ArtistForm, Artist),
+    'shows': (ShowForm, Shows),
+}
+
+# form fields stored under a different column name
+COLUMN_NAMES = {'website_link': 'website'}
+
+TRUE_VALUES = {'y', 'yes', 'true', '1', 'on'}
+
+
+class RowError(Exception):
+    pass
+
+
+class RowField:
+    # minimal stand-in for a bound form field, enough to run the WTForms
+    # validators declared in forms.py against a single value
+    def __init__(self, data):
+        self.data = data
+        self.errors = []
+
+    def gettext(self, string):
+        return string
+
+    def ngettext(self, singular, plural, n):
+        return singular if n == 1 else plural
+
+
+class RowValidator:
+    # validates and converts rows using the field declarations of a form
+    # class, built once per import instead of binding a form per row
+    def __init__(self, form_class, model):
+        self.columns = model.__table__.c
+        self.fields = []
+        for name in dir(form_class):
+            unbound = getattr(form_class, name)
+            if isinstance(unbound, UnboundField):
+                column = COLUMN_NAMES.get(name, name)
+                if column in self.columns:
+                    self.fields.append((name, column, unbound))
+
+    def text(self, name, value):
+        # NDJSON numbers and booleans are read as the text a form would get
+        if isinstance(value, (dict, list)):
+            raise RowError(f'{name}: not a single value')
+        return str(value)
+
+    def convert(self, name, unbound, value):
+        # turn a raw CSV/NDJSON value into the type the field produces
+        field_class = unbound.field_class
+        if value is None or value == '' or value == []:
+            return [] if issubclass(field_class, SelectMultipleField) else None
+        if issubclass(field_class, SelectMultipleField):
+            if isinstance(value, list):
+                values = [self.text(name, v) for v in value]
+            else:
+                values = self.text(name, value).split(',')
+            values = [v.strip() for v in values if v.strip()]
+            self.check_choices(name, unbound, values)
+            return values
+        if issubclass(field_class, BooleanField):
+            if isinstance(value, bool):
+                return value
+            return self.text(name, value).strip().lower() in TRUE_VALUES
+        value = self.text(name, value)
+        if issubclass(field_class, SelectField):
+            self.check_choices(name, unbound, [value])
+            return value
+        if issubclass(field_class, DateTimeField):
+            date_format = unbound.kwargs.get('format', '%Y-%m-%d %H:%M:%S')
+            try:
+                return datetime.strptime(value, date_format)
+            except ValueError:
+                raise RowError(f'{name}: not a valid datetime')
+        return value
+
+    def check_choices(self, name, unbound, values):
+        choices = {choice for choice, _ in unbound.kwargs.get('choices', [])}
+        invalid = [value for value in values if value not in choices]
+        if invalid:
+            raise RowError(f'{name}: not a valid choice: {", ".join(invalid)}')
+
+    def __call__(self, row):
+        # return the validated row as a dict of column values
+        if not isinstance(row, dict):
+            raise RowError('not an object')
+        values = {}
+        for name, column, unbound in self.fields:
+            raw = row.get(name, row.get(column))
+            value = self.convert(name, unbound, raw)
+            for validator in unbound.kwargs.get('validators', []):
+                # optional fields are only checked when present
+                if value in (None, []) and not isinstance(validator, DataRequired):
+                    continue
+                try:
+                    validator(None, RowField(value))
+                except (StopValidation, ValidationError) as e:
+                    raise RowError(f'{name}: {e or "invalid value"}')
+            if value is not None and self.columns[column].type.python_type is int:
+                try:
+                    value = int(value)
+                except ValueError:
+                    raise RowError(f'{name}: not an integer')
+            values[column] = value
+        return values
+
+
+def read_rows(path):
+    # stream rows from a CSV (with a header row) or NDJSON file
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def insert_batch(insert, batch, on_error):
+    # insert (line, values) pairs in a savepoint, returning the number of
+    # rows inserted. A batch double-booking a venue or artist is retried a
+    # row at a time, so only the conflicting rows are rejected
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert, [values for _, values in batch])
+        return len(batch)
+    except IntegrityError as e:
+        if e.orig.pgcode != EXCLUSION_VIOLATION:
+            raise
+    inserted = 0
+    for line, values in batch:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert, values)
+            inserted += 1
+        except IntegrityError as e:
+            if e.orig.pgcode != EXCLUSION_VIOLATION:
+                raise
+            on_error(line, 'the venue or the artist already has a show '
+                           'at that time')
+    return inserted
+
+
+def import_rows(kind, rows, batch_size, on_error):
+    # insert validated rows in executemany batches, returning the number of
+    # rows inserted and rejected. on_error(line, message) is called for
+    # every rejected row
+    form_class, model = IMPORTS[kind]
+    validate = RowValidator(form_class, model)
+    insert = model.__table__.insert()
+    batch, inserted, rejected = [], 0, 0
+    for line, row in enumerate(rows, start=1):
+        try:
+            batch.append((line, validate(row)))
+        except RowError as e:
+            rejected += 1
+            on_error(line, str(e))
+            continue
+        if len(batch) >= batch_size:
+            added = insert_batch(insert, batch, on_error)
+            inserted += added
+            rejected += len(batch) - added
+            batch = []
+    if batch:
+        added = insert_batch(insert, batch, on_error)
+        inserted += added
+        rejected += len(batch) - added
+    return inserted, rejected
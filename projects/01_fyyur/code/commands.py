@@ -0,0 +1,199 @@
+from datetime import date, timedelta
+import json
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import SQLAlchemyError
+from config import db
+from show_counts import reconcile_show_counts, start_of_day, start_of_today
+from bulk_import import IMPORTS, import_rows, read_rows
+from assets import build_assets
+from seed_data import generate
+from benchmark import compare, run_benchmark
+from partitions import archive_partitions, ensure_partitions
+from recommendations import rebuild_recommendations
+from search import rebuild_search_documents
+
+# ----------------------------------------------------------------------------#
+# CLI commands, run as `flask fyyur <command>`.
+# ----------------------------------------------------------------------------#
+
+fyyur_cli = AppGroup('fyyur', help='Fyyur maintenance commands.')
+
+
+@fyyur_cli.command('reconcile-counts')
+def reconcile_counts():
+    """Rebuild every venue and artist show counter from the Shows table."""
+    reconcile_show_counts(start_of_today())
+    db.session.commit()
+    click.echo('Show counters rebuilt.')
+
+
+@fyyur_cli.command('rollover')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='First date to roll over (defaults to yesterday).')
+def rollover(since):
+    """Move shows whose date has passed from upcoming to past.
+
+    Also drops the passed dates from the search documents. Meant to run
+    daily, shortly after midnight. Re-running is safe, and --since catches
+    up after missed runs.
+    """
+    today = date.today()
+    since = since.date() if since else today - timedelta(days=1)
+    reconcile_show_counts(start_of_day(today), since=start_of_day(since))
+    rebuild_search_documents(start_of_day(today), since=start_of_day(since))
+    db.session.commit()
+    click.echo(f'Show counters rolled over from {since} to {today}.')
+
+
+@fyyur_cli.command('partitions')
+@click.option('--ahead', default=12, show_default=True,
+              help='Months of partitions to keep created ahead of today.')
+@click.option('--archive-before', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Detach the partitions of months ending on or before this date.')
+def partitions(ahead, archive_before):
+    """Create upcoming monthly Shows partitions and archive old ones.
+
+    Meant to run daily or monthly. Shows already stored in the default
+    partition are moved into the new partitions. Archived partitions are
+    detached but kept as standalone tables, and their shows are taken out
+    of the venue and artist counters.
+    """
+    created = ensure_partitions(date.today(), ahead)
+    archived = []
+    if archive_before:
+        archived = archive_partitions(archive_before.date(), start_of_today())
+    db.session.commit()
+    if archived:
+        current_app.extensions['page_cache'].clear()
+    click.echo(f"Created {len(created)} partitions: {', '.join(created) or '-'}")
+    click.echo(f"Archived {len(archived)} partitions: {', '.join(archived) or '-'}")
+
+
+@fyyur_cli.command('recommendations')
+def recommendations():
+    """Recompute the recommended artists of every venue.
+
+    Edits keep recommendations current; run this after changing the
+    scoring or RECOMMENDATIONS_PER_VENUE.
+    """
+    started = time.perf_counter()
+    stored = rebuild_recommendations()
+    db.session.commit()
+    current_app.extensions['page_cache'].clear()
+    click.echo(f'Stored {stored} recommendations in '
+               f'{time.perf_counter() - started:.1f}s.')
+
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows inserted per executemany batch.')
+def import_file(kind, path, batch_size):
+    """Import venues, artists or shows from a CSV or NDJSON file.
+
+    Rows are validated with the rules declared in forms.py; invalid rows are
+    reported and skipped. The whole file is imported in one transaction.
+    """
+    def report_error(row, message):
+        click.echo(f'{path}: row {row}: {message}', err=True)
+
+    started = time.perf_counter()
+    try:
+        inserted, rejected = import_rows(
+            kind, read_rows(path), batch_size, report_error)
+        if kind == 'shows':
+            # imported shows bypass the per-show counter updates
+            reconcile_show_counts(start_of_today())
+        else:
+            # and imported venues and artists the recommendation updates
+            rebuild_recommendations()
+        # and both the search document updates
+        rebuild_search_documents(start_of_today())
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        raise click.ClickException(f'Import failed, nothing was saved: {e}')
+    current_app.extensions['page_cache'].clear()
+    elapsed = time.perf_counter() - started
+    click.echo(f'Imported {inserted} {kind} ({rejected} rejected) in '
+               f'{elapsed:.2f}s, {inserted / elapsed:.0f} rows/sec.')
+
+
+@fyyur_cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint, minify and precompress the files in static/.
+
+    Output goes to static/build/ with a manifest.json; restart the app to
+    serve it. Run again after changing any static file.
+    """
+    manifest = build_assets(current_app.static_folder)
+    click.echo(f'Built {len(manifest)} assets into static/build/.')
+
+
+@fyyur_cli.command('seed')
+@click.option('--venues', default=10000, show_default=True)
+@click.option('--artists', default=100000, show_default=True)
+@click.option('--shows', default=5000000, show_default=True)
+@click.option('--seed', default=0, show_default=True,
+              help='Random seed; the same seed generates the same data.')
+@click.option('--batch-size', default=10000, show_default=True,
+              help='Rows inserted per executemany batch.')
+@click.confirmation_option(
+    prompt='This deletes every venue, artist and show. Continue?')
+def seed(venues, artists, shows, seed, batch_size):
+    """Replace all data with a deterministic generated data set."""
+    def report_progress(table, inserted):
+        click.echo(f'\r{table}: {inserted} rows', nl=False)
+
+    started = time.perf_counter()
+    try:
+        kept = generate(venues, artists, shows, seed, batch_size, report_progress)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    current_app.extensions['page_cache'].clear()
+    click.echo(f'\nSeeded {venues} venues, {artists} artists and {kept} '
+               f'shows ({shows - kept} double-bookings skipped) in '
+               f'{time.perf_counter() - started:.1f}s.')
+
+
+@fyyur_cli.command('benchmark')
+@click.option('--requests', default=50, show_default=True,
+              help='Timed requests per route.')
+@click.option('--seed', default=0, show_default=True,
+              help='Random seed choosing the venue and artist ids requested.')
+@click.option('--output', default='benchmark.json', show_default=True,
+              type=click.Path(dir_okay=False, writable=True))
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False),
+              help='Earlier output to compare the bytes and ORM objects fetched with.')
+def benchmark(requests, seed, output, baseline):
+    """Time every read route through the test client.
+
+    Reports p50/p95/p99 latency, queries per request, peak traced memory and
+    the bytes and ORM objects fetched per route. The JSON output is stable
+    enough to diff between commits, or to pass as --baseline to a later run.
+    """
+    results = run_benchmark(current_app._get_current_object(), requests, seed)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+    for name, route in results['routes'].items():
+        click.echo(f"{name:<50} p50 {route['p50_ms']:>8.2f}ms  "
+                   f"p95 {route['p95_ms']:>8.2f}ms  p99 {route['p99_ms']:>8.2f}ms  "
+                   f"{route['queries_per_request']:>5} queries  "
+                   f"{route['peak_memory_kb']:>6} KiB  "
+                   f"{route['bytes_per_request']:>9} bytes  "
+                   f"{route['orm_objects_per_request']:>6} objects")
+    for name in results['skipped']:
+        click.echo(f'{name:<50} skipped, no rows to request')
+    if baseline:
+        with open(baseline) as f:
+            changes = compare(json.load(f), results,
+                              ('bytes_per_request', 'orm_objects_per_request'))
+        for name, field, before, after in changes:
+            if before != after:
+                click.echo(f'{name:<50} {field}: {before} -> {after}')
+    click.echo(f'Results written to {output}.')
@@ -1,6 +1,7 @@
 import os
 from flask_sqlalchemy import SQLAlchemy
 from database_config import database_config
+from replica import RoutingSession
 SECRET_KEY = os.urandom(32)
 # Grab the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -8,8 +9,77 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 # Enable debug mode.
 DEBUG = True
 
-# Setup database
-db = SQLAlchemy()
+# Setup database, routing reads of @use_replica views to the replica bind
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # DATABASE URL
 SQLALCHEMY_DATABASE_URI = database_config
+
+# Optional read replica for the listing/detail GET views. Reads stay on the
+# primary for REPLICA_READ_YOUR_WRITES_WINDOW seconds after a client's write
+REPLICA_DATABASE_URI = os.environ.get('FYYUR_REPLICA_DATABASE_URL')
+SQLALCHEMY_BINDS = {'replica': REPLICA_DATABASE_URI} if REPLICA_DATABASE_URI else {}
+REPLICA_READ_YOUR_WRITES_WINDOW = 5
+
+# Maximum number of SQL queries a request may issue before a warning is logged
+QUERY_BUDGET = 10
+# Statements run this many times in one request are logged as possible N+1
+# queries. Query counts, times and repeats are sent as X-Query-* response
+# headers in debug mode, or always with QUERY_DEBUG_HEADERS
+QUERY_REPEAT_THRESHOLD = 5
+QUERY_DEBUG_HEADERS = False
+
+# Maximum number of ranked matches returned by the venue/artist searches
+SEARCH_RESULTS_LIMIT = 50
+# Shorter venue/artist search terms are not ranked by similarity; the
+# trigram index needs three characters
+SEARCH_RANKED_TERM_LENGTH = 3
+
+# Number of ranked venues and artists per page of the unified /search
+SEARCH_PER_PAGE = 20
+
+# Most venues or artists removed by one bulk DELETE /venues or /artists
+BULK_DELETE_MAX_IDS = 1000
+
+# Number of past/upcoming shows listed per page on the venue and artist pages
+SHOWS_PER_PAGE = 12
+
+# Number of shows per page on the /shows listing, and rows fetched per batch
+# when the listing is streamed with /shows?stream=1
+SHOWS_LISTING_PER_PAGE = 60
+SHOWS_STREAM_BATCH_SIZE = 500
+
+# Cache of rendered venue/artist pages: 'memory' (per process), 'filesystem'
+# (shared by the workers on one host) or None to disable. Entries are dropped
+# by the write handlers, and expire after PAGE_CACHE_TTL seconds at the latest
+PAGE_CACHE_TYPE = 'memory'
+PAGE_CACHE_TTL = 300
+PAGE_CACHE_MAX_ENTRIES = 1000
+PAGE_CACHE_DIR = os.path.join(basedir, '.page_cache')
+
+# Logging when debug mode is off: records pass through a bounded queue (extra
+# records are dropped and counted) and are written to size-rotated files
+LOG_QUEUE_SIZE = 10000
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+REQUEST_LOG = 'requests.log'
+
+# Longest date range, in days, served by the show calendar
+CALENDAR_MAX_DAYS = 92
+
+# Most free venues, and most free artists, listed by /availability
+AVAILABILITY_LIMIT = 100
+
+# Most names returned by /autocomplete, and how often (seconds) each process
+# rebuilds its name index in the background to pick up writes made by other
+# processes
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_REFRESH_INTERVAL = 300
+
+# Recommended artists shown on each venue page, precomputed by
+# `flask fyyur recommendations` and kept current by the edit handlers
+RECOMMENDATIONS_PER_VENUE = 6
+
+# Cache lifetime (seconds) of fingerprinted static assets, whose URLs change
+# whenever their content does. Built with `flask fyyur build-assets`
+ASSET_MAX_AGE = 31536000
@@ -0,0 +1,55 @@
+from sqlalchemy import delete, select
+from config import db
+from models import Artist, Venue, Shows, Recommendation
+from recommendations import refresh_venues
+from search import remove_search_documents, update_search_documents
+from show_counts import subtract_show_counts
+
+# ----------------------------------------------------------------------------#
+# Set-based deletes of venues and artists.
+# ----------------------------------------------------------------------------#
+
+# Shows and Recommendation rows are removed by ON DELETE CASCADE, so each
+# delete runs the same few statements however many shows are involved.
+# Both return the ids deleted and the ids of the venue and artist pages
+# that changed, keyed 'venue' and 'artist'
+
+
+def delete_rows(model, ids):
+    return db.session.execute(
+        delete(model).where(model.id.in_(ids)).returning(model.id)
+        .execution_options(synchronize_session=False)).scalars().all()
+
+
+def delete_venues(venue_ids, today):
+    shows = Shows.venue_id.in_(venue_ids)
+    artist_ids = db.session.execute(
+        select(Shows.artist_id).where(shows).distinct()).scalars().all()
+    # the shows must still be there to be counted
+    subtract_show_counts(shows, today)
+    deleted = delete_rows(Venue, venue_ids)
+    remove_search_documents('venue', deleted)
+    update_search_documents(today, artist_ids=artist_ids)
+    return deleted, {'venue': deleted, 'artist': artist_ids}
+
+
+def delete_artists(artist_ids, today):
+    shows = Shows.artist_id.in_(artist_ids)
+    venue_ids = db.session.execute(
+        select(Shows.venue_id).where(shows).distinct()).scalars().all()
+    # venues recommending a deleted artist get their recommendations
+    # recomputed, another artist takes its place
+    recommended_at = db.session.execute(
+        select(Recommendation.venue_id).where(
+            Recommendation.artist_id.in_(artist_ids)).distinct()).scalars().all()
+    subtract_show_counts(shows, today)
+    deleted = delete_rows(Artist, artist_ids)
+    remove_search_documents('artist', deleted)
+    update_search_documents(today, venue_ids=venue_ids)
+    if recommended_at:
+        refresh_venues(recommended_at)
+    return deleted, {'artist': deleted,
+                     'venue': sorted(set(venue_ids) | set(recommended_at))}
+
+
+DELETES = {'venue': delete_venues, 'artist': delete_artists}
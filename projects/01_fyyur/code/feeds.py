@@ -0,0 +1,82 @@
+import hashlib
+import json
+from datetime import timezone
+
+# ----------------------------------------------------------------------------#
+# iCal and JSON schedule feeds.
+# ----------------------------------------------------------------------------#
+
+# iCal lines are folded after this many octets (RFC 5545, 3.1)
+ICAL_LINE_OCTETS = 75
+
+
+def feed_etag(kind, entity_id, details, shows_changed_at, today):
+    # changes whenever the entity's shows or the details of it shown in the
+    # feed change, and daily as shows stop being upcoming. Edited
+    # venues/artists on the other side of a show only appear once one of
+    # those changes
+    key = json.dumps([kind, entity_id, *details, shows_changed_at.isoformat(),
+                      today.isoformat()])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def ical_escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(
+        ',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def ical_time(value):
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def ical_line(line):
+    # fold long content lines, never splitting a UTF-8 character
+    folded, octets = [], 0
+    for char in line:
+        size = len(char.encode())
+        if octets + size > ICAL_LINE_OCTETS:
+            folded.append('\r\n ')
+            # the leading space counts towards the next line
+            octets = 1
+        folded.append(char)
+        octets += size
+    return ''.join(folded) + '\r\n'
+
+
+def ical_feed(name, shows, stamp):
+    # VCALENDAR with one VEVENT per show row, yielded as it is read
+    yield ical_line('BEGIN:VCALENDAR')
+    yield ical_line('VERSION:2.0')
+    yield ical_line('PRODID:-//Fyyur//Show schedule//EN')
+    yield ical_line('X-WR-CALNAME:' + ical_escape(name))
+    for show in shows:
+        location = ', '.join(part for part in (
+            show.venue_address, show.venue_city, show.venue_state) if part)
+        for line in (
+            'BEGIN:VEVENT',
+            f'UID:show-{show.id}@fyyur',
+            'DTSTAMP:' + ical_time(stamp),
+            'DTSTART:' + ical_time(show.start_time),
+            'SUMMARY:' + ical_escape(f'{show.artist_name} at {show.venue_name}'),
+            'LOCATION:' + ical_escape(location),
+            'END:VEVENT',
+        ):
+            yield ical_line(line)
+    yield ical_line('END:VCALENDAR')
+
+
+def json_feed(shows):
+    # {"success": true, "shows": [...]}, yielded one show at a time
+    yield '{"success": true, "shows": ['
+    separator = ''
+    for show in shows:
+        yield separator + json.dumps({
+            "id": show.id,
+            "venue_id": show.venue_id,
+            "venue_name": show.venue_name,
+            "artist_id": show.artist_id,
+            "artist_name": show.artist_name,
+            "start_time": show.start_time.isoformat()
+        })
+        separator = ', '
+    yield ']}'
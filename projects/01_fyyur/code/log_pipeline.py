@@ -0,0 +1,99 @@
+import atexit
+import json
+import logging
+import threading
+import time
+from logging import Formatter
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import Full, Queue
+from flask import g, request
+
+# ----------------------------------------------------------------------------#
+# Non-blocking logging.
+# ----------------------------------------------------------------------------#
+
+REQUEST_LOGGER = 'fyyur.requests'
+
+
+class DroppingQueueHandler(QueueHandler):
+    # hands records to a bounded queue without ever blocking the request
+    # thread; records arriving while the queue is full are counted and dropped
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            with self._lock:
+                self.dropped += 1
+
+
+class JsonFormatter(Formatter):
+    # one JSON object per line, from the fields passed as `extra`
+    def format(self, record):
+        return json.dumps({
+            "time": self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            **record.request
+        })
+
+
+def init_logging(app):
+    # write the error log and a JSON lines request log from a background
+    # thread, so request threads only pay for a queue put
+    log_queue = Queue(maxsize=app.config['LOG_QUEUE_SIZE'])
+    queue_handler = DroppingQueueHandler(log_queue)
+
+    error_handler = RotatingFileHandler(
+        'error.log', maxBytes=app.config['LOG_MAX_BYTES'],
+        backupCount=app.config['LOG_BACKUP_COUNT'])
+    error_handler.setFormatter(
+        Formatter(
+            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+    )
+    error_handler.setLevel(logging.INFO)
+    error_handler.addFilter(lambda record: record.name != REQUEST_LOGGER)
+
+    request_handler = RotatingFileHandler(
+        app.config['REQUEST_LOG'], maxBytes=app.config['LOG_MAX_BYTES'],
+        backupCount=app.config['LOG_BACKUP_COUNT'])
+    request_handler.setFormatter(JsonFormatter())
+    request_handler.addFilter(logging.Filter(REQUEST_LOGGER))
+
+    listener = QueueListener(
+        log_queue, error_handler, request_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    app.logger.setLevel(logging.INFO)
+    app.logger.addHandler(queue_handler)
+    request_logger = logging.getLogger(REQUEST_LOGGER)
+    request_logger.setLevel(logging.INFO)
+    request_logger.propagate = False
+    request_logger.addHandler(queue_handler)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        # structured record of every request, parseable offline
+        started = g.get('request_started')
+        request_logger.info('request', extra={"request": {
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else None,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3)
+            if started is not None else None,
+            "sql_count": g.get('query_count', 0),
+            "sql_ms": round(g.get('query_time', 0) * 1000, 3),
+            "dropped_logs": queue_handler.dropped,
+        }})
+        return response
+
+    app.extensions['log_queue_handler'] = queue_handler
+    return listener
@@ -0,0 +1,43 @@
+"""add show counters to venue and artist
+
+Revision ID: 065f47e82c44
+Revises: 18c3d1aab58d
+Create Date: 2026-10-17 10:03:57.261840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '065f47e82c44'
+down_revision = '18c3d1aab58d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+    # backfill the counters from the existing shows
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(f'''
+            UPDATE "{table}" SET
+                upcoming_shows_count = (
+                    SELECT count(*) FROM "Shows"
+                    WHERE "Shows".{key} = "{table}".id
+                    AND "Shows".start_time >= current_date),
+                past_shows_count = (
+                    SELECT count(*) FROM "Shows"
+                    WHERE "Shows".{key} = "{table}".id
+                    AND "Shows".start_time < current_date)
+        ''')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
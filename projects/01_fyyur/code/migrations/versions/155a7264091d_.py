@@ -0,0 +1,36 @@
+"""add precomputed artist recommendations for venues
+
+Revision ID: 155a7264091d
+Revises: 7d05b4eac5ca
+Create Date: 2026-10-17 23:58:06.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '155a7264091d'
+down_revision = '7d05b4eac5ca'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # filled by `flask fyyur recommendations`
+    op.create_table(
+        'Recommendation',
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('venue_id', 'artist_id')
+    )
+    op.create_index('ix_Recommendation_artist_id', 'Recommendation',
+                    ['artist_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Recommendation_artist_id', table_name='Recommendation')
+    op.drop_table('Recommendation')
@@ -0,0 +1,32 @@
+"""add trigram indexes on venue and artist names
+
+Revision ID: 18c3d1aab58d
+Revises: 0b46bd4f7f44
+Create Date: 2026-10-17 09:12:31.418206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '18c3d1aab58d'
+down_revision = '0b46bd4f7f44'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm lets ilike '%term%' and similarity() use a GIN index
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'], unique=False,
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'], unique=False,
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
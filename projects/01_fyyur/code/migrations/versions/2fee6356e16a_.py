@@ -0,0 +1,29 @@
+"""add shows_changed_at to venues and artists
+
+Revision ID: 2fee6356e16a
+Revises: 3f059f79c90b
+Create Date: 2026-10-18 01:12:37.250961
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2fee6356e16a'
+down_revision = '3f059f79c90b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # now() is evaluated once, so neither table is rewritten
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column(
+            'shows_changed_at', sa.DateTime(timezone=True), nullable=False,
+            server_default=sa.text('now()')))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'shows_changed_at')
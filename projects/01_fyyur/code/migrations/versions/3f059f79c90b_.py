@@ -0,0 +1,66 @@
+"""add search documents for the unified search
+
+Revision ID: 3f059f79c90b
+Revises: 155a7264091d
+Create Date: 2026-10-18 00:41:12.904518
+
+Documents are built for every existing venue and artist; later ones are
+kept in sync by the app, see search.py.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3f059f79c90b'
+down_revision = '155a7264091d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'SearchDocument',
+        sa.Column('kind', sa.String(length=6), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('city', sa.String(length=120), nullable=True),
+        sa.Column('state', sa.String(length=120), nullable=True),
+        sa.Column('genres', postgresql.ARRAY(sa.String(length=120)), nullable=True),
+        sa.Column('upcoming_dates', postgresql.ARRAY(sa.Date()), nullable=True),
+        sa.Column('document', postgresql.TSVECTOR(), nullable=False),
+        sa.PrimaryKeyConstraint('kind', 'entity_id')
+    )
+    # same documents as search.upsert_documents
+    for kind, table, key in (('venue', 'Venue', 'venue_id'),
+                             ('artist', 'Artist', 'artist_id')):
+        op.execute(f'''
+            INSERT INTO "SearchDocument"
+            SELECT '{kind}', e.id, e.name, e.city, e.state, e.genres,
+                (SELECT array_agg(DISTINCT CAST(s.start_time AS DATE)
+                                  ORDER BY CAST(s.start_time AS DATE))
+                 FROM "Shows" s
+                 WHERE s.{key} = e.id AND s.start_time >= CURRENT_DATE),
+                setweight(to_tsvector('simple', coalesce(e.name, '')), 'A') ||
+                setweight(to_tsvector('simple', concat_ws(' ', e.city, e.state)), 'B') ||
+                setweight(to_tsvector('simple', coalesce(
+                    array_to_string(e.genres, ' '), '')), 'C')
+            FROM "{table}" e
+        ''')
+    # built after the rows are in, which is faster than maintaining them
+    op.create_index('ix_SearchDocument_document', 'SearchDocument',
+                    ['document'], unique=False, postgresql_using='gin')
+    op.create_index('ix_SearchDocument_name_trgm', 'SearchDocument', ['name'],
+                    unique=False, postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_SearchDocument_upcoming_dates', 'SearchDocument',
+                    ['upcoming_dates'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_SearchDocument_upcoming_dates', table_name='SearchDocument')
+    op.drop_index('ix_SearchDocument_name_trgm', table_name='SearchDocument')
+    op.drop_index('ix_SearchDocument_document', table_name='SearchDocument')
+    op.drop_table('SearchDocument')
@@ -0,0 +1,76 @@
+"""add show end times and reject double-booked venues and artists
+
+Revision ID: 5c81e0d7b3a4
+Revises: ac125fa00f9a
+Create Date: 2026-10-18 02:23:51.604127
+
+Existing shows end 3 hours (models.SHOW_DURATION) after they start, or
+earlier when their venue or artist has a later show starting before then,
+so that they satisfy the new constraints. Every partition attached to Shows
+gets the booking exclusion constraints of partitions.BOOKING_CONSTRAINT;
+new partitions are given theirs by partitions.create_partition. Archived
+tables detached from Shows are left as they are.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c81e0d7b3a4'
+down_revision = 'ac125fa00f9a'
+branch_labels = None
+depends_on = None
+
+
+def for_each_partition(statement):
+    # run statement, with {table} and {key} substituted, for each partition
+    # of Shows and each booked key
+    statement = statement.replace("'", "''").replace(
+        '{table}', "' || c.relname || '").replace('{key}', "' || k || '")
+    op.execute(f'''
+        DO $$
+        DECLARE c record; k text;
+        BEGIN
+            FOR c IN
+                SELECT child.relname FROM pg_inherits
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE pg_inherits.inhparent = '"Shows"'::regclass
+            LOOP
+                FOREACH k IN ARRAY ARRAY['venue_id', 'artist_id'] LOOP
+                    EXECUTE '{statement}';
+                END LOOP;
+            END LOOP;
+        END $$
+    ''')
+
+
+def upgrade():
+    op.add_column('Shows', sa.Column(
+        'end_time', sa.DateTime(timezone=True), nullable=True))
+    # least() ignores the NULL of a venue's or artist's last show
+    op.execute('''
+        UPDATE "Shows" SET end_time = least(
+            "Shows".start_time + interval '3 hours', n.next_venue, n.next_artist)
+        FROM (
+            SELECT id, start_time,
+                lead(start_time) OVER (
+                    PARTITION BY venue_id ORDER BY start_time, id) AS next_venue,
+                lead(start_time) OVER (
+                    PARTITION BY artist_id ORDER BY start_time, id) AS next_artist
+            FROM "Shows") n
+        WHERE "Shows".id = n.id AND "Shows".start_time = n.start_time
+    ''')
+    op.alter_column('Shows', 'end_time', nullable=False)
+    # same as partitions.BOOKING_CONSTRAINT
+    for_each_partition('''
+        ALTER TABLE "{table}" ADD CONSTRAINT "{table}_{key}_booking"
+        EXCLUDE USING gist (int4range({key}, {key}, '[]') WITH &&,
+                            tstzrange(start_time, end_time) WITH &&)
+    ''')
+
+
+def downgrade():
+    for_each_partition(
+        'ALTER TABLE "{table}" DROP CONSTRAINT "{table}_{key}_booking"')
+    op.drop_column('Shows', 'end_time')
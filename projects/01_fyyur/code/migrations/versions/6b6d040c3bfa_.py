@@ -0,0 +1,36 @@
+"""add show lookup and genre indexes
+
+Revision ID: 6b6d040c3bfa
+Revises: 065f47e82c44
+Create Date: 2026-10-17 10:48:09.530172
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b6d040c3bfa'
+down_revision = '065f47e82c44'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # per-entity show counts and past/upcoming ranges
+    op.create_index('ix_Shows_venue_id_start_time', 'Shows',
+                    ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Shows_artist_id_start_time', 'Shows',
+                    ['artist_id', 'start_time'], unique=False)
+    # genre containment (@>, &&) lookups
+    op.create_index('ix_Venue_genres', 'Venue', ['genres'], unique=False,
+                    postgresql_using='gin')
+    op.create_index('ix_Artist_genres', 'Artist', ['genres'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_index('ix_Venue_genres', table_name='Venue')
+    op.drop_index('ix_Shows_artist_id_start_time', table_name='Shows')
+    op.drop_index('ix_Shows_venue_id_start_time', table_name='Shows')
@@ -0,0 +1,113 @@
+"""partition shows by month of start_time
+
+Revision ID: 7d05b4eac5ca
+Revises: 9dee0cb3e9af
+Create Date: 2026-10-17 23:24:31.518207
+
+Shows is rebuilt as a table range partitioned on start_time, with one
+partition per UTC month and a default partition for shows beyond the last
+one. Existing rows are copied over, so Shows is locked for the duration of
+the copy. Later partitions are managed by `flask fyyur partitions`.
+
+start_time becomes NOT NULL and part of the primary key, as Postgres
+requires of a partition key; the copy fails if a show has no start_time.
+
+"""
+from datetime import date
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d05b4eac5ca'
+down_revision = '9dee0cb3e9af'
+branch_labels = None
+depends_on = None
+
+# monthly partitions created ahead of the current month
+MONTHS_AHEAD = 12
+
+INDEXES = {
+    'ix_Shows_venue_id_start_time': ['venue_id', 'start_time'],
+    'ix_Shows_artist_id_start_time': ['artist_id', 'start_time'],
+    'ix_Shows_start_time': ['start_time'],
+}
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_shows_table(primary_key, start_time_nullable, **kwargs):
+    op.create_table(
+        'Shows',
+        sa.Column('id', sa.Integer(), nullable=False,
+                  server_default=sa.text('nextval(\'"Shows_id_seq"\'::regclass)')),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(timezone=True),
+                  nullable=start_time_nullable),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+        primary_key,
+        **kwargs
+    )
+
+
+def move_shows(old_table):
+    # copy every show into the new Shows table, drop the old one and index
+    # the new one, which also indexes every partition
+    op.execute(f'''
+        INSERT INTO "Shows" (id, artist_id, venue_id, start_time)
+        SELECT id, artist_id, venue_id, start_time FROM "{old_table}"
+    ''')
+    op.execute('ALTER SEQUENCE "Shows_id_seq" OWNED BY "Shows".id')
+    op.drop_table(old_table)
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'Shows', columns, unique=False)
+
+
+def upgrade():
+    op.rename_table('Shows', 'Shows_unpartitioned')
+    # index names are unique per schema
+    op.execute('ALTER INDEX "Shows_pkey" RENAME TO "Shows_unpartitioned_pkey"')
+    for name in INDEXES:
+        op.drop_index(name, table_name='Shows_unpartitioned')
+
+    create_shows_table(sa.PrimaryKeyConstraint('id', 'start_time'), False,
+                       postgresql_partition_by='RANGE (start_time)')
+    op.execute('CREATE TABLE "Shows_default" PARTITION OF "Shows" DEFAULT')
+
+    # one partition per month, from the oldest show to MONTHS_AHEAD months
+    # out; shows further ahead land in the default partition, as do older
+    # shows in offline (--sql) mode, where the oldest show is unknown
+    this_month = date.today().replace(day=1)
+    first = this_month
+    if not context.is_offline_mode():
+        oldest = op.get_bind().exec_driver_sql(
+            'SELECT min(start_time AT TIME ZONE \'UTC\') FROM "Shows_unpartitioned"'
+        ).scalar()
+        if oldest is not None:
+            first = min(first, oldest.date().replace(day=1))
+    month = first
+    while month <= add_months(this_month, MONTHS_AHEAD):
+        end = add_months(month, 1)
+        op.execute(
+            f'''CREATE TABLE "Shows_y{month:%Ym%m}" PARTITION OF "Shows"
+                FOR VALUES FROM ('{month} 00:00:00+00') TO ('{end} 00:00:00+00')''')
+        month = end
+
+    move_shows('Shows_unpartitioned')
+
+
+def downgrade():
+    # detached (archived) partitions are left as they are
+    op.rename_table('Shows', 'Shows_partitioned')
+    op.execute('ALTER INDEX "Shows_pkey" RENAME TO "Shows_partitioned_pkey"')
+    for name in INDEXES:
+        op.drop_index(name, table_name='Shows_partitioned')
+
+    create_shows_table(sa.PrimaryKeyConstraint('id'), True)
+    # dropping the partitioned table drops its partitions
+    move_shows('Shows_partitioned')
@@ -0,0 +1,94 @@
+"""convert shows start_time to timestamptz
+
+Revision ID: 9dee0cb3e9af
+Revises: e79a8d867964
+Create Date: 2026-10-17 13:05:12.774019
+
+The type change is done through a shadow column so the Shows table is never
+rewritten under an exclusive lock:
+
+1. add a nullable start_time_tz column, kept in sync by a trigger while the
+   running app still writes start_time
+2. backfill it in committed batches and build its indexes CONCURRENTLY
+3. swap the columns, which only takes a brief lock
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9dee0cb3e9af'
+down_revision = 'e79a8d867964'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+# index name -> indexed columns, rebuilt on the new column
+INDEXES = {
+    'ix_Shows_venue_id_start_time': 'venue_id, start_time_tz',
+    'ix_Shows_artist_id_start_time': 'artist_id, start_time_tz',
+    'ix_Shows_start_time': 'start_time_tz',
+}
+
+
+def upgrade():
+    op.add_column('Shows', sa.Column(
+        'start_time_tz', sa.DateTime(timezone=True), nullable=True))
+    op.execute('''
+        CREATE FUNCTION shows_sync_start_time_tz() RETURNS trigger AS $$
+        BEGIN
+            NEW.start_time_tz := NEW.start_time::timestamptz;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    op.execute('''
+        CREATE TRIGGER shows_sync_start_time_tz
+        BEFORE INSERT OR UPDATE OF start_time ON "Shows"
+        FOR EACH ROW EXECUTE FUNCTION shows_sync_start_time_tz()
+    ''')
+
+    with op.get_context().autocommit_block():
+        if context.is_offline_mode():
+            op.execute('''
+                UPDATE "Shows" SET start_time_tz = start_time::timestamptz
+                WHERE start_time_tz IS NULL AND start_time IS NOT NULL
+            ''')
+        else:
+            # batches walk the primary key, each starting after the last id
+            # of the one before, so no batch rescans the rows already done.
+            # Each commits on its own, keeping row locks short
+            backfill = sa.text(f'''
+                WITH batch AS (
+                    SELECT id FROM "Shows" WHERE id > :last
+                    ORDER BY id LIMIT {BATCH_SIZE}
+                ), updated AS (
+                    UPDATE "Shows" SET start_time_tz = start_time::timestamptz
+                    WHERE id IN (SELECT id FROM batch)
+                    AND start_time_tz IS NULL AND start_time IS NOT NULL
+                )
+                SELECT max(id) FROM batch
+            ''')
+            connection = op.get_bind()
+            last = 0
+            while last is not None:
+                last = connection.execute(backfill, {'last': last}).scalar()
+        for name, columns in INDEXES.items():
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY "{name}_tz" ON "Shows" ({columns})')
+
+    op.execute('DROP TRIGGER shows_sync_start_time_tz ON "Shows"')
+    op.execute('DROP FUNCTION shows_sync_start_time_tz()')
+    # dropping the old column also drops its indexes
+    op.drop_column('Shows', 'start_time')
+    op.alter_column('Shows', 'start_time_tz', new_column_name='start_time')
+    for name in INDEXES:
+        op.execute(f'ALTER INDEX "{name}_tz" RENAME TO "{name}"')
+
+
+def downgrade():
+    # rewrites the table, dropping the time of day
+    op.alter_column('Shows', 'start_time', type_=sa.Date(),
+                    postgresql_using='start_time::date')
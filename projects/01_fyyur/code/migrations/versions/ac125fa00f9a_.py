@@ -0,0 +1,59 @@
+"""cascade deletes of venues and artists to their shows
+
+Revision ID: ac125fa00f9a
+Revises: 2fee6356e16a
+Create Date: 2026-10-18 01:47:09.318564
+
+The foreign keys of Shows, and of archived partitions detached from it,
+are recreated with ON DELETE CASCADE under their current names, which
+differ between databases. Postgres cannot add a NOT VALID foreign key to
+a partitioned table, so every show is checked again while Shows is
+locked.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ac125fa00f9a'
+down_revision = '2fee6356e16a'
+branch_labels = None
+depends_on = None
+
+
+def replace_foreign_keys(definition):
+    # recreate each Venue/Artist foreign key of Shows and of the archived
+    # Shows_yYYYYmMM tables, with the definition computed from `def`, its
+    # current definition. Partitions follow their parent
+    op.execute(f'''
+        DO $$
+        DECLARE c record;
+        BEGIN
+            FOR c IN
+                SELECT conrelid::regclass AS tbl, conname,
+                       pg_get_constraintdef(oid) AS def
+                FROM pg_constraint
+                WHERE contype = 'f' AND conparentid = 0
+                AND confrelid IN ('"Venue"'::regclass, '"Artist"'::regclass)
+                AND conrelid IN (
+                    SELECT oid FROM pg_class
+                    WHERE relname = 'Shows' OR (
+                        relname ~ '^Shows_y[0-9]{{4}}m[0-9]{{2}}$'
+                        AND NOT relispartition))
+            LOOP
+                EXECUTE 'ALTER TABLE ' || c.tbl::text
+                    || ' DROP CONSTRAINT ' || quote_ident(c.conname)
+                    || ', ADD CONSTRAINT ' || quote_ident(c.conname)
+                    || ' ' || {definition};
+            END LOOP;
+        END $$
+    ''')
+
+
+def upgrade():
+    replace_foreign_keys("c.def || ' ON DELETE CASCADE'")
+
+
+def downgrade():
+    replace_foreign_keys("replace(c.def, ' ON DELETE CASCADE', '')")
@@ -0,0 +1,79 @@
+"""check bookings across month boundaries of the Shows partitions
+
+Revision ID: b4e29f6a1c07
+Revises: 5c81e0d7b3a4
+Create Date: 2026-10-18 03:05:44.128390
+
+The exclusion constraints of each partition cannot see the neighbouring
+partition. A show whose booking starts within 3 hours (models.SHOW_DURATION)
+after, or ends after, the boundary of its UTC month is checked by this
+trigger instead, holding a transaction lock on its venue and its artist so
+concurrent bookings are checked one after the other. Postgres clones the
+trigger onto every partition, including ones attached later.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e29f6a1c07'
+down_revision = '5c81e0d7b3a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # raises the SQLSTATE of the exclusion constraints, so callers handle
+    # both the same way
+    op.execute('''
+        CREATE FUNCTION shows_check_boundary_booking() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            month_start timestamp :=
+                date_trunc('month', NEW.start_time AT TIME ZONE 'UTC');
+        BEGIN
+            IF NEW.end_time <= NEW.start_time OR (
+                    NEW.start_time >= (month_start AT TIME ZONE 'UTC')
+                        + interval '3 hours'
+                    AND NEW.end_time <= (month_start + interval '1 month')
+                        AT TIME ZONE 'UTC') THEN
+                RETURN NULL;
+            END IF;
+            PERFORM pg_advisory_xact_lock(hashtext('Shows.venue_id'), NEW.venue_id);
+            PERFORM pg_advisory_xact_lock(hashtext('Shows.artist_id'), NEW.artist_id);
+            -- each query takes a new snapshot, seeing bookings committed
+            -- while this one waited for the locks
+            IF EXISTS (
+                SELECT 1 FROM "Shows" s
+                WHERE s.venue_id = NEW.venue_id
+                AND s.start_time < NEW.end_time
+                AND s.start_time > NEW.start_time - interval '3 hours'
+                AND s.end_time > NEW.start_time AND s.end_time > s.start_time
+                AND (s.id, s.start_time) <> (NEW.id, NEW.start_time)
+            ) OR EXISTS (
+                SELECT 1 FROM "Shows" s
+                WHERE s.artist_id = NEW.artist_id
+                AND s.start_time < NEW.end_time
+                AND s.start_time > NEW.start_time - interval '3 hours'
+                AND s.end_time > NEW.start_time AND s.end_time > s.start_time
+                AND (s.id, s.start_time) <> (NEW.id, NEW.start_time)
+            ) THEN
+                RAISE EXCEPTION USING ERRCODE = 'exclusion_violation',
+                    MESSAGE = 'show ' || NEW.id || ' overlaps another show '
+                        || 'of its venue or artist across a month boundary';
+            END IF;
+            RETURN NULL;
+        END $$
+    ''')
+    op.execute('''
+        CREATE TRIGGER "Shows_boundary_booking"
+        AFTER INSERT OR UPDATE OF venue_id, artist_id, start_time, end_time
+        ON "Shows" FOR EACH ROW
+        EXECUTE FUNCTION shows_check_boundary_booking()
+    ''')
+
+
+def downgrade():
+    op.execute('DROP TRIGGER "Shows_boundary_booking" ON "Shows"')
+    op.execute('DROP FUNCTION shows_check_boundary_booking()')
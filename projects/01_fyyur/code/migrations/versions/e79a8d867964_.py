@@ -0,0 +1,25 @@
+"""add start_time index on shows
+
+Revision ID: e79a8d867964
+Revises: 6b6d040c3bfa
+Create Date: 2026-10-17 12:20:44.108356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e79a8d867964'
+down_revision = '6b6d040c3bfa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # date range scans for the calendar
+    op.create_index('ix_Shows_start_time', 'Shows', ['start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Shows_start_time', table_name='Shows')
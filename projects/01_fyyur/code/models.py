@@ -1,12 +1,36 @@
+from datetime import timedelta
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred
 from config import db
 
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
 
+# Venue and Artist columns only the detail pages need, left out of ORM loads
+# unless a query asks for them with undefer_group(DETAILS)
+DETAILS = 'details'
+
+# how long a show books its venue and artist for. Overlapping bookings are
+# rejected by the exclusion constraints of the Shows partitions, see
+# partitions.py
+SHOW_DURATION = timedelta(hours=3)
+
+
+def show_end(context):
+    # default end_time, SHOW_DURATION after start_time
+    return context.get_current_parameters()['start_time'] + SHOW_DURATION
+
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        # trigram index backing the name search
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        # genre containment lookups
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -14,40 +38,118 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
+    image_link = deferred(db.Column(db.String(500)), group=DETAILS)
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = deferred(db.Column(ARRAY(db.String(120))), group=DETAILS)
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String)
-    shows = db.relationship('Shows', backref='venue')
+    seeking_description = deferred(db.Column(db.String), group=DETAILS)
+    # denormalized counters, see show_counts.py
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    # last time a show was added or removed, for the feed ETags
+    shows_changed_at = db.Column(db.DateTime(timezone=True), nullable=False,
+                                 server_default=db.func.now())
+    # shows are deleted by the database, ON DELETE CASCADE
+    shows = db.relationship('Shows', backref='venue', passive_deletes=True)
 
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        # trigram index backing the name search
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        # genre containment lookups
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)), nullable=False)
-    image_link = db.Column(db.String(500))
+    genres = deferred(db.Column(ARRAY(db.String(120)), nullable=False),
+                      group=DETAILS)
+    image_link = deferred(db.Column(db.String(500)), group=DETAILS)
     facebook_link = db.Column(db.String(120))
     address = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String)
-    shows = db.relationship('Shows', backref='artist')
+    seeking_description = deferred(db.Column(db.String), group=DETAILS)
+    # denormalized counters, see show_counts.py
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    # last time a show was added or removed, for the feed ETags
+    shows_changed_at = db.Column(db.DateTime(timezone=True), nullable=False,
+                                 server_default=db.func.now())
+    # shows are deleted by the database, ON DELETE CASCADE
+    shows = db.relationship('Shows', backref='artist', passive_deletes=True)
 
 
 class Shows(db.Model):
     __tablename__ = 'Shows'
+    __table_args__ = (
+        # per-entity show counts and past/upcoming ranges
+        db.Index('ix_Shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Shows_artist_id_start_time', 'artist_id', 'start_time'),
+        # date range scans for the calendar
+        db.Index('ix_Shows_start_time', 'start_time'),
+        # monthly partitions, see partitions.py
+        {'postgresql_partition_by': 'RANGE (start_time)'},
+    )
 
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(
-        'Artist.id'), nullable=False)
+        'Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'Venue.id', ondelete='CASCADE'), nullable=False)
+    # the partition key, which Postgres requires in the primary key
+    start_time = db.Column(db.DateTime(timezone=True), primary_key=True)
+    end_time = db.Column(db.DateTime(timezone=True), nullable=False,
+                         default=show_end)
+
+
+class Recommendation(db.Model):
+    # artists that fit a venue, precomputed by recommendations.py
+    __tablename__ = 'Recommendation'
+    __table_args__ = (
+        # the artist's rows are replaced when it is edited
+        db.Index('ix_Recommendation_artist_id', 'artist_id'),
+    )
+
     venue_id = db.Column(db.Integer, db.ForeignKey(
-        'Venue.id'
-    ), nullable=False)
-    start_time = db.Column(db.Date)
+        'Venue.id', ondelete='CASCADE'), primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'Artist.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+
+class SearchDocument(db.Model):
+    # denormalized venue and artist rows searched by /search, see search.py
+    __tablename__ = 'SearchDocument'
+    __table_args__ = (
+        # full text matches on name, city, state and genres
+        db.Index('ix_SearchDocument_document', 'document', postgresql_using='gin'),
+        # partial name matches, as in the venue/artist searches
+        db.Index('ix_SearchDocument_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        # upcoming show date lookups
+        db.Index('ix_SearchDocument_upcoming_dates', 'upcoming_dates',
+                 postgresql_using='gin'),
+    )
+
+    # 'venue' or 'artist', with the id of the venue or artist
+    kind = db.Column(db.String(6), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    genres = db.Column(ARRAY(db.String(120)))
+    # distinct dates of the upcoming shows, earliest first
+    upcoming_dates = db.Column(ARRAY(db.Date))
+    document = db.Column(TSVECTOR, nullable=False)
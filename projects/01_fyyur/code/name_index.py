@@ -0,0 +1,125 @@
+import bisect
+import threading
+import time
+from config import db
+from models import Artist, Venue
+
+# ----------------------------------------------------------------------------#
+# In-memory name index for autocomplete.
+# ----------------------------------------------------------------------------#
+
+INDEXED = {'venue': Venue, 'artist': Artist}
+
+
+def name_keys(name):
+    # lowercased suffixes starting at each word, so "The Musical Hop" is
+    # found by "the", "mus" or "hop"
+    name = (name or '').lower()
+    starts = [0] + [i + 1 for i, char in enumerate(name) if char == ' ']
+    return {name[start:] for start in starts if name[start:].strip()}
+
+
+def apply_change(entries, names, kind, entity_id, name):
+    # replace the entries of one venue/artist with those of name, or drop
+    # them when name is None. Applying the same change twice is harmless
+    old = names.pop((kind, entity_id), None)
+    if old is not None:
+        for key in name_keys(old):
+            entry = (key, kind, entity_id, old)
+            i = bisect.bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+    if name is not None:
+        names[(kind, entity_id)] = name
+        for key in name_keys(name):
+            bisect.insort(entries, (key, kind, entity_id, name))
+
+
+class NameIndex:
+    # sorted array of (key, kind, id, name) entries searched with bisect.
+    # Built at startup and kept current by the write handlers of this
+    # process; a background thread rebuilds it every refresh_interval
+    # seconds to pick up writes made by other processes. Searches never
+    # query the database
+    def __init__(self, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self._entries = []
+        self._names = {}
+        # changes made while a build runs, replayed onto its result, or
+        # None when no build is running
+        self._changes = None
+        self._lock = threading.RLock()
+
+    def build(self):
+        with self._lock:
+            self._changes = []
+        try:
+            entries, names = [], {}
+            for kind, model in INDEXED.items():
+                for entity_id, name in db.session.query(model.id, model.name):
+                    names[(kind, entity_id)] = name
+                    entries.extend(
+                        (key, kind, entity_id, name) for key in name_keys(name))
+            entries.sort()
+            with self._lock:
+                # the rows read may predate these changes
+                for change in self._changes:
+                    apply_change(entries, names, *change)
+                self._entries, self._names = entries, names
+        finally:
+            with self._lock:
+                self._changes = None
+
+    def start(self, app):
+        # build the index now, then rebuild it in a daemon thread. A failed
+        # build, e.g. before the tables are migrated, is retried next time
+        def build():
+            try:
+                with app.app_context():
+                    self.build()
+            except Exception as e:
+                app.logger.warning('name index build failed: %s', e)
+
+        def refresh():
+            while True:
+                time.sleep(self.refresh_interval)
+                build()
+
+        build()
+        threading.Thread(target=refresh, name='name-index', daemon=True).start()
+
+    def _change(self, kind, entity_id, name):
+        with self._lock:
+            apply_change(self._entries, self._names, kind, entity_id, name)
+            if self._changes is not None:
+                self._changes.append((kind, entity_id, name))
+
+    def add(self, kind, entity_id, name):
+        self._change(kind, entity_id, name)
+
+    def remove(self, kind, entity_id):
+        self._change(kind, entity_id, None)
+
+    def rename(self, kind, entity_id, name):
+        self._change(kind, entity_id, name)
+
+    def search(self, prefix, limit, kind=None):
+        # up to limit (kind, id, name) matches whose name or one of its
+        # words starts with prefix, in alphabetical order of the match
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        with self._lock:
+            entries = self._entries
+            i = bisect.bisect_left(entries, (prefix,))
+            results, seen = [], set()
+            while i < len(entries) and len(results) < limit:
+                key, entry_kind, entity_id, name = entries[i]
+                if not key.startswith(prefix):
+                    break
+                i += 1
+                if (kind and entry_kind != kind) or (entry_kind, entity_id) in seen:
+                    continue
+                seen.add((entry_kind, entity_id))
+                results.append((entry_kind, entity_id, name))
+        return results
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, request, session
+
+# ----------------------------------------------------------------------------#
+# Read-through cache of rendered pages.
+# ----------------------------------------------------------------------------#
+
+
+class NullCache:
+    # used when PAGE_CACHE_TYPE is unset, every lookup misses
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache:
+    # in-process LRU cache with a per-entry time to live. Each worker
+    # process holds its own copy, so invalidation is local to the process
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            # mark as most recently used
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            # evict least recently used entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemCache:
+    # cache shared by every worker on a host, one file per page. A file's
+    # mtime records its last use, so the oldest files are evicted first
+    def __init__(self, directory, max_entries, ttl):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(
+            self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                expires = float(f.readline())
+                value = f.read()
+        except (OSError, ValueError):
+            return None
+        if expires < time.time():
+            self.delete(key)
+            return None
+        # mark as most recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        # write to a temporary file and rename so readers never see a
+        # partially written page
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(f'{time.time() + self.ttl}\n')
+            f.write(value)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        # remove least recently used files beyond max_entries
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def init_page_cache(app):
+    # pick the backend named by PAGE_CACHE_TYPE
+    cache_type = app.config.get('PAGE_CACHE_TYPE')
+    max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', 1000)
+    ttl = app.config.get('PAGE_CACHE_TTL', 300)
+    if cache_type == 'memory':
+        cache = MemoryCache(max_entries, ttl)
+    elif cache_type == 'filesystem':
+        cache = FileSystemCache(app.config['PAGE_CACHE_DIR'], max_entries, ttl)
+    else:
+        cache = NullCache()
+    app.extensions['page_cache'] = cache
+    return cache
+
+
+def page_key(prefix, entity_id):
+    return f'{prefix}:{entity_id}'
+
+
+def cached_page(prefix, id_arg):
+    # serve the view from the page cache, keyed by the entity id in the
+    # view argument id_arg. Requests with a query string (e.g. pagination)
+    # or pending flash messages bypass the cache
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if request.args or session.get('_flashes'):
+                return f(*args, **kwargs)
+            cache = current_app.extensions['page_cache']
+            if isinstance(cache, NullCache):
+                return f(*args, **kwargs)
+            key = page_key(prefix, kwargs[id_arg])
+            page = cache.get(key)
+            if page is None:
+                # rendered from the primary, a lagging replica would have
+                # its stale page cached for PAGE_CACHE_TTL
+                g.caching_page = True
+                page = f(*args, **kwargs)
+                if not isinstance(page, str):
+                    # only cache plain rendered pages, not errors/redirects
+                    return page
+                cache.set(key, page)
+            return page
+        return wrapper
+    return decorator
+
+
+def invalidate_page(prefix, *entity_ids):
+    # drop the cached pages of the given entities after a write
+    cache = current_app.extensions['page_cache']
+    for entity_id in entity_ids:
+        cache.delete(page_key(prefix, entity_id))
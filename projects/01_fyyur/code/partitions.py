@@ -0,0 +1,120 @@
+import re
+from datetime import date, datetime, timezone
+from sqlalchemy import and_, text
+from config import db
+from models import Shows
+from show_counts import subtract_show_counts
+
+# ----------------------------------------------------------------------------#
+# Monthly partitions of the Shows table.
+# ----------------------------------------------------------------------------#
+
+# Shows is range partitioned on start_time into one partition per UTC month,
+# plus a default partition holding shows beyond the last monthly partition
+PARTITION_NAME = 'Shows_y{:04d}m{:02d}'
+PARTITION_PATTERN = re.compile(r'^Shows_y(\d{4})m(\d{2})$')
+DEFAULT_PARTITION = 'Shows_default'
+
+# a venue or artist cannot have two shows whose [start_time, end_time)
+# overlap. Postgres has no exclusion constraints on partitioned tables, so
+# each partition carries its own, and shows near a month boundary are
+# checked against the neighbouring partition by the Shows_boundary_booking
+# trigger (see migration b4e29f6a1c07). int4range(id, id, '[]') &&
+# compares the ids with the built-in range GiST support, where id WITH =
+# would need the btree_gist extension
+BOOKED_KEYS = ('venue_id', 'artist_id')
+BOOKING_CONSTRAINT = '''
+    ALTER TABLE "{table}" ADD CONSTRAINT "{table}_{key}_booking"
+    EXCLUDE USING gist (int4range({key}, {key}, '[]') WITH &&,
+                        tstzrange(start_time, end_time) WITH &&)
+'''
+# SQLSTATE of an insert rejected by one of them, or by the trigger
+EXCLUSION_VIOLATION = '23P01'
+
+
+def add_months(month, months):
+    # first day of the month `months` after month
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_bounds(month):
+    # [start, end) of a monthly partition, UTC midnight on the first days
+    return tuple(datetime(day.year, day.month, 1, tzinfo=timezone.utc)
+                 for day in (month, add_months(month, 1)))
+
+
+def monthly_partitions():
+    # month -> name of every monthly partition attached to Shows
+    names = db.session.execute(text('''
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = '"Shows"'::regclass
+    ''')).scalars()
+    partitions = {}
+    for name in names:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_partition(month):
+    # add the partition for month, moving its rows out of the default
+    # partition first; attaching would fail while they are still there
+    name = PARTITION_NAME.format(month.year, month.month)
+    start, end = partition_bounds(month)
+    db.session.execute(text(
+        f'CREATE TABLE "{name}" (LIKE "Shows" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    db.session.execute(text(f'''
+        WITH moved AS (
+            DELETE FROM "{DEFAULT_PARTITION}"
+            WHERE start_time >= :start AND start_time < :end
+            RETURNING *)
+        INSERT INTO "{name}" SELECT * FROM moved
+    '''), {'start': start, 'end': end})
+    # built after the moved rows are in
+    for key in BOOKED_KEYS:
+        db.session.execute(text(BOOKING_CONSTRAINT.format(table=name, key=key)))
+    # partition bounds must be literals, not bound parameters
+    db.session.execute(text(f'''
+        ALTER TABLE "Shows" ATTACH PARTITION "{name}"
+        FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+    '''))
+    return name
+
+
+def ensure_partitions(today, ahead, since=None):
+    # create any missing partition from the month of since (default this
+    # month) to `ahead` months out, returning the names created
+    existing = monthly_partitions()
+    # months whose partition was archived stay in the default partition
+    archived = set(db.session.execute(text('''
+        SELECT relname FROM pg_class
+        WHERE relkind = 'r' AND NOT relispartition AND relname LIKE 'Shows\\_y%'
+    ''')).scalars())
+    month = (since or today).replace(day=1)
+    last = add_months(today.replace(day=1), ahead)
+    created = []
+    while month <= last:
+        if (month not in existing and
+                PARTITION_NAME.format(month.year, month.month) not in archived):
+            created.append(create_partition(month))
+        month = add_months(month, 1)
+    return created
+
+
+def archive_partitions(before, today):
+    # detach every monthly partition ending on or before `before`. Detached
+    # partitions stay in the database as standalone archive tables, and
+    # their shows are taken out of the venue and artist counters
+    archived = []
+    for month, name in sorted(monthly_partitions().items()):
+        if add_months(month, 1) > before:
+            break
+        start, end = partition_bounds(month)
+        subtract_show_counts(and_(Shows.start_time >= start,
+                                  Shows.start_time < end), today)
+        db.session.execute(text(f'ALTER TABLE "Shows" DETACH PARTITION "{name}"'))
+        archived.append(name)
+    return archived
@@ -0,0 +1,173 @@
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, tuple_
+from config import db
+from models import Artist, Venue, Recommendation
+
+# ----------------------------------------------------------------------------#
+# Precomputed artist recommendations for venues.
+# ----------------------------------------------------------------------------#
+
+# venues scored per matrix product in a full rebuild; each batch holds a few
+# float32 matrices of BATCH_SIZE x number of artists
+BATCH_SIZE = 64
+
+
+def features(genres, city, state):
+    # the set compared between a venue and an artist: genres, state and city
+    found = {'genre:' + genre for genre in genres or []}
+    if state:
+        found.add('state:' + state)
+        if city:
+            found.add(f'city:{city.strip().lower()}|{state}')
+    return found
+
+
+def encode(feature_sets, vocabulary):
+    # one row per feature set, with a 1 in the column of each feature
+    matrix = np.zeros((len(feature_sets), len(vocabulary)), dtype=np.float32)
+    for row, found in enumerate(feature_sets):
+        matrix[row, [vocabulary[feature] for feature in found]] = 1
+    return matrix
+
+
+def jaccard(venues, venue_sizes, artists, genre_columns):
+    # |A & B| / |A | B| of every venue row against every artist row. Pairs
+    # sharing no genre score 0, however close they are
+    shared = venues @ artists.T
+    union = venue_sizes[:, None] + artists.sum(axis=1)[None, :] - shared
+    scores = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+    shared_genres = venues[:, genre_columns] @ artists[:, genre_columns].T
+    scores[shared_genres == 0] = 0
+    return scores
+
+
+def encode_artists(artist_rows):
+    # (vocabulary, artist matrix, genre columns) for rows of (id, genres,
+    # city, state), encoded once and scored against any number of venues
+    artist_features = [features(*row[1:]) for row in artist_rows]
+    vocabulary = {feature: column for column, feature in enumerate(
+        sorted(set().union(*artist_features)))}
+    genre_columns = [column for feature, column in vocabulary.items()
+                     if feature.startswith('genre:')]
+    return vocabulary, encode(artist_features, vocabulary), genre_columns
+
+
+def score_venues(venue_rows, encoded_artists):
+    # venue x artist score matrix for rows of (id, genres, city, state).
+    # Venue features no artist has are never shared, they only add to the
+    # size of the venue's set
+    vocabulary, artists, genre_columns = encoded_artists
+    venue_features = [features(*row[1:]) for row in venue_rows]
+    venues = encode([found & vocabulary.keys() for found in venue_features],
+                    vocabulary)
+    venue_sizes = np.array([len(found) for found in venue_features],
+                           dtype=np.float32)
+    return jaccard(venues, venue_sizes, artists, genre_columns)
+
+
+def top_rows(venue_ids, artist_ids, scores, k):
+    # Recommendation rows for the k best scoring artists of each venue.
+    # Ties go to the lowest artist id, as in refresh_artist
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return []
+    kth_scores = np.partition(scores, -k, axis=1)[:, -k]
+    rows = []
+    for venue_id, row, kth in zip(venue_ids, scores, kth_scores):
+        above = np.flatnonzero(row > kth)
+        tied = np.flatnonzero(row == kth)[:k - len(above)]
+        rows.extend({'venue_id': venue_id, 'artist_id': artist_ids[column],
+                     'score': float(row[column])}
+                    for column in np.concatenate((above, tied)) if row[column] > 0)
+    return rows
+
+
+def entity_rows(model, *criteria):
+    # (id, genres, city, state) rows in id order
+    return db.session.query(
+        model.id, model.genres, model.city, model.state
+    ).filter(*criteria).order_by(model.id).all()
+
+
+def rebuild_recommendations():
+    # recompute every venue's recommendations in vectorized batches,
+    # returning the number of rows stored
+    k = current_app.config['RECOMMENDATIONS_PER_VENUE']
+    venues = entity_rows(Venue)
+    artists = entity_rows(Artist)
+    artist_ids = [row.id for row in artists]
+    encoded_artists = encode_artists(artists)
+    db.session.execute(delete(Recommendation))
+    stored = 0
+    for start in range(0, len(venues), BATCH_SIZE):
+        batch = venues[start:start + BATCH_SIZE]
+        rows = top_rows([row.id for row in batch], artist_ids,
+                        score_venues(batch, encoded_artists), k)
+        if rows:
+            db.session.execute(insert(Recommendation), rows)
+        stored += len(rows)
+    return stored
+
+
+def refresh_venues(venue_ids):
+    # recompute the recommendations of a few venues, after they changed or
+    # lost an artist. Only artists sharing a genre with them can score
+    k = current_app.config['RECOMMENDATIONS_PER_VENUE']
+    db.session.execute(delete(Recommendation).where(
+        Recommendation.venue_id.in_(venue_ids)))
+    venues = entity_rows(Venue, Venue.id.in_(venue_ids))
+    genres = sorted(set().union(*(row.genres or [] for row in venues)))
+    if not genres:
+        return
+    artists = entity_rows(Artist, Artist.genres.overlap(genres))
+    rows = top_rows([row.id for row in venues], [row.id for row in artists],
+                    score_venues(venues, encode_artists(artists)), k)
+    if rows:
+        db.session.execute(insert(Recommendation), rows)
+
+
+def refresh_artist(artist_id):
+    # update recommendations after an artist was created or edited,
+    # returning the ids of the venues whose recommendations changed
+    k = current_app.config['RECOMMENDATIONS_PER_VENUE']
+    previous = dict(db.session.execute(
+        delete(Recommendation).where(Recommendation.artist_id == artist_id)
+        .returning(Recommendation.venue_id, Recommendation.score)).all())
+    artist = entity_rows(Artist, Artist.id == artist_id)
+    venues = entity_rows(Venue, Venue.genres.overlap(artist[0].genres)) \
+        if artist and artist[0].genres else []
+    scores = dict(zip(
+        (row.id for row in venues),
+        score_venues(venues, encode_artists(artist))[:, 0].tolist()
+    )) if venues else {}
+
+    # venues where the artist scores lower than before need a full
+    # recompute, another artist may now rank above it
+    dropped = [venue_id for venue_id, score in previous.items()
+               if scores.get(venue_id, 0) < score]
+    # elsewhere the artist is added, then cut if it is not in the top k
+    candidates = {venue_id: score for venue_id, score in scores.items()
+                  if score > 0 and venue_id not in dropped}
+    if candidates:
+        db.session.execute(insert(Recommendation), [
+            {'venue_id': venue_id, 'artist_id': artist_id, 'score': score}
+            for venue_id, score in candidates.items()])
+        ranked = select(
+            Recommendation.venue_id, Recommendation.artist_id,
+            func.row_number().over(
+                partition_by=Recommendation.venue_id,
+                order_by=(Recommendation.score.desc(), Recommendation.artist_id)
+            ).label('rank')
+        ).where(Recommendation.venue_id.in_(candidates)).subquery()
+        db.session.execute(delete(Recommendation).where(
+            tuple_(Recommendation.venue_id, Recommendation.artist_id).in_(
+                select(ranked.c.venue_id, ranked.c.artist_id)
+                .where(ranked.c.rank > k))
+        ).execution_options(synchronize_session=False))
+    if dropped:
+        refresh_venues(dropped)
+
+    kept = db.session.execute(select(Recommendation.venue_id).where(
+        Recommendation.artist_id == artist_id)).scalars()
+    return set(dropped) | set(kept)
@@ -0,0 +1,57 @@
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# ----------------------------------------------------------------------------#
+# Read replica routing.
+# ----------------------------------------------------------------------------#
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    # sends the queries of views marked with @use_replica to the replica
+    # bind, when one is configured. Flushes always go to the primary
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_request_context()
+                and g.get('use_replica')):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def note_write(db_session):
+    # the request committed a write; failed or rejected submissions, which
+    # roll back and report it on a 200 page, don't
+    if has_request_context():
+        g.wrote = True
+
+
+def use_replica(f):
+    # route a read-only view to the replica, unless this client submitted a
+    # write recently enough that the replica may not have caught up yet, or
+    # the page is rendered into the shared page cache (see cached_page),
+    # where a lagging replica's render would be served to everyone
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        wrote_at = session.get('wrote_at')
+        window = current_app.config['REPLICA_READ_YOUR_WRITES_WINDOW']
+        g.use_replica = not g.get('caching_page') and (
+            wrote_at is None or time.time() - wrote_at > window)
+        return f(*args, **kwargs)
+    return wrapper
+
+
+def remember_write(response):
+    # start the read-your-writes window after every committed write
+    if g.get('wrote'):
+        session['wrote_at'] = time.time()
+    return response
+
+
+def init_replica(app):
+    app.after_request(remember_write)
@@ -0,0 +1,121 @@
+from datetime import date
+from sqlalchemy import Date, cast, delete, distinct, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from config import db
+from models import Artist, Venue, Shows, SearchDocument
+
+# ----------------------------------------------------------------------------#
+# Unified venue and artist search documents.
+# ----------------------------------------------------------------------------#
+
+# text search configuration of the documents and queries; 'simple' does no
+# stemming or stop word removal, which suits names
+TEXT_SEARCH_CONFIG = 'simple'
+
+# each searched kind with its model and the Shows column referencing it
+SEARCHED = {
+    'venue': (Venue, Shows.venue_id),
+    'artist': (Artist, Shows.artist_id),
+}
+
+# escape character of the LIKE patterns built by contains_pattern
+LIKE_ESCAPE = '\\'
+
+COLUMNS = ['kind', 'entity_id', 'name', 'city', 'state', 'genres',
+           'upcoming_dates', 'document']
+
+
+def contains_pattern(term):
+    # LIKE pattern matching term anywhere, with its own %, _ and \ taken
+    # literally. Use with ilike(..., escape=LIKE_ESCAPE)
+    for char in (LIKE_ESCAPE, '%', '_'):
+        term = term.replace(char, LIKE_ESCAPE + char)
+    return f'%{term}%'
+
+
+def weighted(text, weight):
+    return func.setweight(func.to_tsvector(
+        TEXT_SEARCH_CONFIG, func.coalesce(text, '')), weight)
+
+
+def document(model):
+    # name ranks above city and state, which rank above genres
+    return weighted(model.name, 'A').op('||')(
+        weighted(func.concat_ws(' ', model.city, model.state), 'B')).op('||')(
+        weighted(func.array_to_string(model.genres, ' '), 'C'))
+
+
+def upsert_documents(kind, today, *criteria):
+    # insert or replace the documents of the rows of kind matching criteria
+    # in one INSERT ... SELECT, reading upcoming show dates off the
+    # (entity, start_time) Shows indexes
+    model, key = SEARCHED[kind]
+    day = cast(Shows.start_time, Date)
+    upcoming_dates = select(
+        func.array_agg(aggregate_order_by(distinct(day), day))
+    ).where(key == model.id, Shows.start_time >= today).scalar_subquery()
+    rows = select(literal(kind), model.id, model.name, model.city, model.state,
+                  model.genres, upcoming_dates, document(model)).where(*criteria)
+    statement = insert(SearchDocument).from_select(COLUMNS, rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['kind', 'entity_id'],
+        set_={column: statement.excluded[column] for column in COLUMNS[2:]}))
+
+
+def update_search_documents(today, venue_ids=(), artist_ids=()):
+    # refresh the documents of venues and artists after they, or their
+    # shows, were created or edited, inside the caller's transaction
+    for kind, ids in (('venue', venue_ids), ('artist', artist_ids)):
+        if ids:
+            model, _ = SEARCHED[kind]
+            upsert_documents(kind, today, model.id.in_(ids))
+
+
+def remove_search_documents(kind, ids):
+    # drop the documents of deleted venues or artists
+    db.session.execute(delete(SearchDocument).where(
+        SearchDocument.kind == kind, SearchDocument.entity_id.in_(ids)))
+
+
+def rebuild_search_documents(today, since=None):
+    # rebuild every document. With since, only venues and artists with a
+    # show dated in [since, today) are refreshed, dropping dates that have
+    # passed, as reconcile_show_counts does for the counters
+    if since is None:
+        db.session.execute(delete(SearchDocument))
+    for kind, (model, key) in SEARCHED.items():
+        criteria = [] if since is None else [model.id.in_(select(key).where(
+            Shows.start_time >= since, Shows.start_time < today))]
+        upsert_documents(kind, today, *criteria)
+
+
+def search_documents(term, page, per_page, kind=None):
+    # one page of the documents matching term by name, text or upcoming
+    # show date (YYYY-MM-DD), best first, plus the first row of the next
+    # page if there is one. Matches are not counted, which would read
+    # every one of them
+    query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, term)
+    matches = [SearchDocument.document.op('@@')(query),
+               SearchDocument.name.ilike(contains_pattern(term),
+                                         escape=LIKE_ESCAPE)]
+    try:
+        matches.append(SearchDocument.upcoming_dates.contains(
+            [date.fromisoformat(term)]))
+    except ValueError:
+        pass
+    rank = func.ts_rank(SearchDocument.document, query) + \
+        func.similarity(SearchDocument.name, term)
+    documents = db.session.query(
+        SearchDocument.kind,
+        SearchDocument.entity_id,
+        SearchDocument.name,
+        SearchDocument.city,
+        SearchDocument.state,
+        SearchDocument.genres,
+        SearchDocument.upcoming_dates[1].label('next_show')
+    ).filter(or_(*matches))
+    if kind:
+        documents = documents.filter(SearchDocument.kind == kind)
+    return documents.order_by(
+        rank.desc(), SearchDocument.kind, SearchDocument.entity_id
+    ).limit(per_page + 1).offset((page - 1) * per_page).all()
@@ -0,0 +1,135 @@
+import random
+from datetime import timedelta, timezone
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from config import db
+from forms import ArtistForm, VenueForm
+from models import SHOW_DURATION, Artist, Venue, Shows
+from show_counts import reconcile_show_counts, start_of_today
+from partitions import ensure_partitions, partition_bounds
+from recommendations import rebuild_recommendations
+from search import rebuild_search_documents
+
+# ----------------------------------------------------------------------------#
+# Deterministic large-scale data generator.
+# ----------------------------------------------------------------------------#
+
+GENRES = [choice for choice, _ in VenueForm.genres.kwargs['choices']]
+STATES = [choice for choice, _ in VenueForm.state.kwargs['choices']]
+ARTIST_GENRES = [choice for choice, _ in ArtistForm.genres.kwargs['choices']]
+
+CITIES = ['San Francisco', 'New York', 'Austin', 'Portland', 'Chicago',
+          'Seattle', 'Nashville', 'New Orleans', 'Denver', 'Atlanta']
+ADJECTIVES = ['Blue', 'Golden', 'Velvet', 'Electric', 'Silent', 'Crimson',
+              'Wild', 'Lucky', 'Midnight', 'Rusty', 'Neon', 'Hollow']
+VENUE_NOUNS = ['Hall', 'Lounge', 'Room', 'Club', 'Theatre', 'Garage',
+               'Tavern', 'Ballroom', 'Cellar', 'Warehouse']
+ARTIST_NOUNS = ['Foxes', 'Owls', 'Rivers', 'Machines', 'Echoes', 'Saints',
+                'Wolves', 'Comets', 'Lanterns', 'Strangers']
+
+# shows are spread over this window around today, mostly in the past
+PAST_DAYS = 730
+UPCOMING_DAYS = 365
+
+
+def batches(rows, size):
+    # split an iterator of rows into lists of at most size rows
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def venue_rows(rng, count):
+    for i in range(1, count + 1):
+        yield {
+            'name': f'The {rng.choice(ADJECTIVES)} {rng.choice(VENUE_NOUNS)} {i}',
+            'city': rng.choice(CITIES),
+            'state': rng.choice(STATES),
+            'address': f'{rng.randint(1, 9999)} Main Street',
+            'phone': f'{rng.randint(200, 999)}-555-{rng.randint(0, 9999):04d}',
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'image_link': f'https://example.com/venues/{i}.jpg',
+            'facebook_link': f'https://www.facebook.com/venue{i}',
+            'website': f'https://venue{i}.example.com',
+            'seeking_talent': rng.random() < 0.5,
+            'seeking_description': 'Looking for local acts.',
+        }
+
+
+def artist_rows(rng, count):
+    for i in range(1, count + 1):
+        yield {
+            'name': f'{rng.choice(ADJECTIVES)} {rng.choice(ARTIST_NOUNS)} {i}',
+            'city': rng.choice(CITIES),
+            'state': rng.choice(STATES),
+            'phone': f'{rng.randint(200, 999)}-555-{rng.randint(0, 9999):04d}',
+            'genres': rng.sample(ARTIST_GENRES, rng.randint(1, 3)),
+            'image_link': f'https://example.com/artists/{i}.jpg',
+            'facebook_link': f'https://www.facebook.com/artist{i}',
+            'website': f'https://artist{i}.example.com',
+            'seeking_venue': rng.random() < 0.5,
+            'seeking_description': 'Available for weekend shows.',
+        }
+
+
+def show_rows(rng, count, venues, artists, today):
+    first = today - timedelta(days=PAST_DAYS)
+    minutes = (PAST_DAYS + UPCOMING_DAYS) * 24 * 60
+    for _ in range(count):
+        # on the quarter hour
+        start = first + timedelta(minutes=rng.randrange(0, minutes, 15))
+        # ending by the end of its partition's month. A show crossing into
+        # the next partition is checked by the boundary trigger, which
+        # raises rather than letting ON CONFLICT DO NOTHING skip it
+        month_end = partition_bounds(start.astimezone(timezone.utc).date())[1]
+        yield {
+            'venue_id': rng.randint(1, venues),
+            'artist_id': rng.randint(1, artists),
+            'start_time': min(start, month_end - SHOW_DURATION),
+        }
+
+
+def generate(venues, artists, shows, seed, batch_size, on_progress):
+    # replace every venue, artist and show with generated ones. The same
+    # seed always produces the same rows, with show dates relative to today
+    # so the past/upcoming split stays the same from day to day. Shows that
+    # would double-book a venue or artist are skipped; the number of shows
+    # kept is returned
+    if shows and not (venues and artists):
+        raise ValueError('shows need at least one venue and one artist')
+    today = start_of_today()
+    db.session.execute(text(
+        'TRUNCATE "Shows", "Venue", "Artist" RESTART IDENTITY CASCADE'))
+    # monthly partitions for every generated show, keeping them out of the
+    # default partition
+    ensure_partitions(today.date(), UPCOMING_DAYS // 30 + 1,
+                      since=(today - timedelta(days=PAST_DAYS)).date())
+    tables = (
+        (Venue, venue_rows(random.Random(f'{seed}-venues'), venues)),
+        (Artist, artist_rows(random.Random(f'{seed}-artists'), artists)),
+        (Shows, show_rows(random.Random(f'{seed}-shows'), shows,
+                          venues, artists, today)),
+    )
+    for model, rows in tables:
+        inserted = 0
+        for batch in batches(rows, batch_size):
+            # only Shows has conflicts, with its booking constraints
+            db.session.execute(insert(model).on_conflict_do_nothing(), batch)
+            # commit each batch, keeping the transaction small at 5M rows
+            db.session.commit()
+            inserted += len(batch)
+            on_progress(model.__tablename__, inserted)
+    reconcile_show_counts(today)
+    rebuild_recommendations()
+    rebuild_search_documents(today)
+    db.session.commit()
+    # refresh planner statistics for the new table sizes
+    db.session.execute(text('ANALYZE "Venue", "Artist", "Shows", '
+                            '"Recommendation", "SearchDocument"'))
+    db.session.commit()
+    return db.session.scalar(select(func.count()).select_from(Shows))
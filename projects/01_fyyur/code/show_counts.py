@@ -0,0 +1,83 @@
+from datetime import date, datetime, time
+from sqlalchemy import case, func, select, update
+from config import db
+from models import Artist, Venue, Shows
+
+# ----------------------------------------------------------------------------#
+# Denormalized show counters and change times.
+# ----------------------------------------------------------------------------#
+
+
+def start_of_day(day):
+    # local midnight at the start of day, as an aware datetime
+    return datetime.combine(day, time.min).astimezone()
+
+
+def start_of_today():
+    # boundary between past and upcoming shows
+    return start_of_day(date.today())
+
+
+# each counted model paired with the Shows column referencing it
+COUNTED = ((Venue, Shows.venue_id), (Artist, Shows.artist_id))
+
+
+def add_show_counts(show, today, delta=1):
+    # add delta to the counters of the venue and artist of a single show,
+    # inside the caller's transaction
+    upcoming = show.start_time >= today
+    for model, key in COUNTED:
+        column = model.upcoming_shows_count if upcoming else model.past_shows_count
+        db.session.execute(
+            update(model)
+            .where(model.id == getattr(show, key.key))
+            .values({column: column + delta,
+                     model.shows_changed_at: func.now()})
+        )
+
+
+def subtract_show_counts(criterion, today):
+    # remove shows matching criterion from the counters of every venue and
+    # artist they belong to, with one set-based update per table. Call
+    # before the shows themselves are deleted
+    for model, key in COUNTED:
+        counts = select(
+            key.label('id'),
+            func.count(Shows.id).filter(
+                Shows.start_time >= today).label('upcoming'),
+            func.count(Shows.id).filter(
+                Shows.start_time < today).label('past')
+        ).where(criterion).group_by(key).subquery()
+        db.session.execute(
+            update(model)
+            .where(model.id == counts.c.id)
+            .values(
+                upcoming_shows_count=model.upcoming_shows_count - counts.c.upcoming,
+                past_shows_count=model.past_shows_count - counts.c.past,
+                shows_changed_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+
+def reconcile_show_counts(today, since=None):
+    # rebuild the counters from the Shows table in bulk. With since, only
+    # entities with a show dated in [since, today) are rebuilt, which is
+    # exactly the set whose shows moved from upcoming to past.
+    # shows_changed_at, and with it the feed ETags, only moves where shows
+    # were added or removed behind the counters' back, e.g. by an import;
+    # shows becoming past are covered by the date in the ETag
+    for model, key in COUNTED:
+        shows = select(func.count(Shows.id)).where(
+            key == model.id).scalar_subquery()
+        counted = model.upcoming_shows_count + model.past_shows_count
+        statement = update(model).values(
+            upcoming_shows_count=shows.where(Shows.start_time >= today),
+            past_shows_count=shows.where(Shows.start_time < today),
+            shows_changed_at=case((shows != counted, func.now()),
+                                  else_=model.shows_changed_at)
+        ).execution_options(synchronize_session=False)
+        if since is not None:
+            statement = statement.where(model.id.in_(
+                select(key).where(Shows.start_time >= since,
+                                  Shows.start_time < today)))
+        db.session.execute(statement)
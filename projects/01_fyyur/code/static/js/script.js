@@ -2,3 +2,22 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// suggest venue/artist names from /autocomplete while typing in a search box
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  input.addEventListener('input', function () {
+    var url = '/autocomplete?type=' + input.dataset.autocomplete +
+      '&q=' + encodeURIComponent(input.value);
+    fetch(url).then(function (response) {
+      return response.json();
+    }).then(function (data) {
+      list.innerHTML = '';
+      data.results.forEach(function (result) {
+        var option = document.createElement('option');
+        option.value = result.name;
+        list.appendChild(option);
+      });
+    });
+  });
+});
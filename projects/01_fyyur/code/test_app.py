@@ -0,0 +1,756 @@
+import os
+import re
+import tempfile
+import unittest
+from datetime import date, datetime, time, timedelta, timezone
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+
+from app import app, name_index
+from assets import minify_js
+from bulk_import import import_rows
+from config import db
+from models import Venue, Artist, Shows, Recommendation, SearchDocument
+from page_cache import FileSystemCache, MemoryCache, NullCache
+from query_budget import QueryBudgetAssertions, statement_shape
+from recommendations import refresh_artist, refresh_venues
+from search import search_documents, update_search_documents
+from show_counts import add_show_counts, reconcile_show_counts, start_of_today
+
+# a genre no other row has, keeping the genre filters selective however
+# much data the database holds
+GENRE = 'Query Plan Genre'
+
+
+class ShowFixtureTestCase(unittest.TestCase):
+    """Base class providing a venue and an artist with two shows"""
+
+    def setUp(self):
+        """Create a venue and an artist with a past and an upcoming show."""
+        self.client = app.test_client
+        with app.app_context():
+            venue = Venue(name='Query Plan Venue', city='San Francisco',
+                          state='CA', genres=[GENRE])
+            artist = Artist(name='Query Plan Artist', city='San Francisco',
+                            state='CA', genres=[GENRE])
+            db.session.add_all([venue, artist])
+            db.session.flush()
+            db.session.add_all([
+                Shows(venue_id=venue.id, artist_id=artist.id,
+                      start_time=start_of_today() + timedelta(days=days))
+                for days in (-30, 30)
+            ])
+            db.session.commit()
+            self.venue_id, self.artist_id = venue.id, artist.id
+        # make sure the detail pages are rendered, not served from cache
+        app.extensions['page_cache'].clear()
+
+    def tearDown(self):
+        """Remove the rows created in setUp."""
+        with app.app_context():
+            Shows.query.filter_by(venue_id=self.venue_id).delete()
+            Venue.query.filter_by(id=self.venue_id).delete()
+            Artist.query.filter_by(id=self.artist_id).delete()
+            db.session.commit()
+
+
+class QueryPlanTestCase(ShowFixtureTestCase):
+    """Checks the hot queries in app.py are served by the indexes"""
+
+    def capture_statements(self, path):
+        # request path, returning every (statement, parameters) it executed
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters,
+                                  context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            res = self.client().get(path)
+        finally:
+            event.remove(Engine, 'before_cursor_execute',
+                         before_cursor_execute)
+        self.assertEqual(res.status_code, 200)
+        return statements
+
+    def query_plans(self, statements):
+        # EXPLAIN each statement with sequential scans disabled, so the
+        # planner picks an index whenever one can serve the query
+        plans = []
+        with app.app_context():
+            with db.engine.connect() as connection:
+                connection.exec_driver_sql('SET enable_seqscan = off')
+                for statement, parameters in statements:
+                    rows = connection.exec_driver_sql(
+                        'EXPLAIN ' + statement, parameters)
+                    plans.append('\n'.join(row[0] for row in rows))
+        return plans
+
+    def count_index_uses(self, index, path):
+        plans = self.query_plans(self.capture_statements(path))
+        return sum(index in plan for plan in plans)
+
+    def test_show_venue_uses_venue_start_time_index(self):
+        """Venue page counts and both show lists use (venue_id, start_time)"""
+        # matches the partitions' indexes, such as Shows_y2026m10_venue_id_start_time_idx
+        uses = self.count_index_uses(
+            'venue_id_start_time', f'/venues/{self.venue_id}')
+
+        self.assertEqual(uses, 3)
+
+    def test_show_artist_uses_artist_start_time_index(self):
+        """Artist page counts and both show lists use (artist_id, start_time)"""
+        uses = self.count_index_uses(
+            'artist_id_start_time', f'/artists/{self.artist_id}')
+
+        self.assertEqual(uses, 3)
+
+    def test_venues_genre_filter_uses_genre_index(self):
+        """Venue listing and facet counts use the genres GIN index"""
+        uses = self.count_index_uses('ix_Venue_genres', f'/venues?genre={GENRE}')
+
+        self.assertEqual(uses, 2)
+
+    def test_artists_genre_filter_uses_genre_index(self):
+        """Artist listing and facet counts use the genres GIN index"""
+        uses = self.count_index_uses('ix_Artist_genres', f'/artists?genre={GENRE}')
+
+        self.assertEqual(uses, 2)
+
+
+class QueryBudgetTestCase(QueryBudgetAssertions, ShowFixtureTestCase):
+    """Checks the routes stay within their query budgets, without N+1s"""
+
+    def test_listings_stay_within_budget(self):
+        """Listings run a fixed number of queries"""
+        for path, budget in (('/venues', 2), ('/artists', 2), ('/shows', 1)):
+            with self.subTest(path=path), self.assertMaxQueries(budget):
+                self.client().get(path)
+
+    def test_detail_pages_stay_within_budget(self):
+        """Venue and artist pages run a fixed number of queries"""
+        for path, budget in ((f'/venues/{self.venue_id}', 5),
+                             (f'/artists/{self.artist_id}', 4)):
+            with self.subTest(path=path), self.assertMaxQueries(budget):
+                self.client().get(path)
+
+    def test_edit_submissions_stay_within_budget(self):
+        """Edits refresh recommendations and search in a fixed number of queries"""
+        for path, name, budget in (
+                (f'/venues/{self.venue_id}/edit', 'Query Plan Venue', 12),
+                (f'/artists/{self.artist_id}/edit', 'Query Plan Artist', 16)):
+            with self.subTest(path=path), self.assertMaxQueries(budget):
+                self.client().post(path, data={
+                    'name': name, 'city': 'San Francisco', 'state': 'CA',
+                    'genres': [GENRE]})
+
+    def test_name_search_takes_wildcards_literally(self):
+        """% and _ match only themselves; short terms still match"""
+        for term, found in (('%%%', False), ('___', False), ('q', True),
+                            ('pl', True), ('plan venue', True)):
+            with self.subTest(term=term), self.assertMaxQueries(1):
+                res = self.client().post('/venues/search', data={'search_term': term})
+                self.assertEqual(b'Query Plan Venue' in res.data, found)
+
+    def test_edit_forms_read_one_row(self):
+        """Edit forms read the id and name only, without loading a model"""
+        for path in (f'/venues/{self.venue_id}/edit',
+                     f'/artists/{self.artist_id}/edit'):
+            with self.subTest(path=path), self.assertMaxQueries(1) as statements:
+                self.client().get(path)
+            self.assertNotIn('genres', statements[0])
+
+    def test_debug_headers_report_queries(self):
+        """Query count, time and repeated statements are sent as headers"""
+        app.config.update(QUERY_DEBUG_HEADERS=True, QUERY_REPEAT_THRESHOLD=1)
+        try:
+            res = self.client().get('/venues')
+        finally:
+            app.config.update(QUERY_DEBUG_HEADERS=False, QUERY_REPEAT_THRESHOLD=5)
+
+        self.assertEqual(res.headers['X-Query-Count'], '2')
+        self.assertIn('X-Query-Time-Ms', res.headers)
+        # with a threshold of 1 every statement counts as repeated
+        self.assertEqual(len(res.headers.getlist('X-Query-Repeated')), 2)
+
+    def test_statement_shape_ignores_values(self):
+        """Statements differing only in values have the same shape"""
+        shapes = {statement_shape(statement) for statement in (
+            'SELECT * FROM "Shows" WHERE venue_id = %(venue_id_1)s',
+            'SELECT * FROM "Shows"  WHERE venue_id = 12',
+            "SELECT * FROM \"Shows\" WHERE venue_id = '12'",
+        )}
+
+        self.assertEqual(len(shapes), 1)
+
+
+class NameIndexTestCase(QueryBudgetAssertions, ShowFixtureTestCase):
+    """Checks /autocomplete is served from memory and kept current"""
+
+    def autocomplete(self, term):
+        with self.assertMaxQueries(0):
+            res = self.client().get('/autocomplete', query_string={'q': term})
+        return [result['name'] for result in res.get_json()['results']]
+
+    def test_autocomplete_does_not_query(self):
+        """A built index answers without a database round trip"""
+        with app.app_context():
+            name_index.build()
+        self.assertIn('Query Plan Venue', self.autocomplete('query plan v'))
+
+    def test_rename_during_build_is_kept(self):
+        """A rename made while the index is rebuilt survives the swap"""
+        def rename(*args):
+            name_index.rename('venue', self.venue_id, 'Renamed Plan Venue')
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', rename, once=True)
+            name_index.build()
+        self.assertEqual(self.autocomplete('renamed plan'), ['Renamed Plan Venue'])
+        self.assertNotIn('Query Plan Venue', self.autocomplete('query plan v'))
+        name_index.remove('venue', self.venue_id)
+
+
+class RecommendationTestCase(ShowFixtureTestCase):
+    """Checks precomputed recommendations follow venue and artist edits"""
+
+    def recommended(self):
+        # artist ids recommended to the fixture venue
+        return {row.artist_id for row in Recommendation.query.filter_by(
+            venue_id=self.venue_id)}
+
+    def test_venue_refresh_recommends_matching_artist(self):
+        """An artist sharing every genre and the city scores 1"""
+        with app.app_context():
+            refresh_venues([self.venue_id])
+            db.session.commit()
+            row = db.session.get(Recommendation, (self.venue_id, self.artist_id))
+            self.assertIsNotNone(row)
+            self.assertEqual(row.score, 1.0)
+        res = self.client().get(f'/venues/{self.venue_id}')
+        self.assertIn(b'Artists That Fit This Venue', res.data)
+        self.assertIn(b'Query Plan Artist', res.data)
+
+    def test_artist_refresh_drops_artist_without_shared_genre(self):
+        """Changing an artist's genres removes it from venue recommendations"""
+        with app.app_context():
+            refresh_venues([self.venue_id])
+            db.session.commit()
+            Artist.query.get(self.artist_id).genres = ['Other Query Plan Genre']
+            db.session.flush()
+            changed = refresh_artist(self.artist_id)
+            db.session.commit()
+            self.assertIn(self.venue_id, changed)
+            self.assertNotIn(self.artist_id, self.recommended())
+
+
+class SearchTestCase(QueryBudgetAssertions, ShowFixtureTestCase):
+    """Checks the unified search over venue and artist documents"""
+
+    def setUp(self):
+        super().setUp()
+        with app.app_context():
+            update_search_documents(start_of_today(), venue_ids=[self.venue_id],
+                                    artist_ids=[self.artist_id])
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            SearchDocument.query.filter(
+                SearchDocument.name.like('Query Plan %')).delete(
+                synchronize_session=False)
+            db.session.commit()
+        super().tearDown()
+
+    def test_search_ranks_venues_and_artists_in_one_query(self):
+        """Matching venues and artists come back from a single statement"""
+        with self.assertMaxQueries(1):
+            res = self.client().get('/search?q=query+plan+venue')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(f'/venues/{self.venue_id}'.encode(), res.data)
+
+    def test_search_matches_upcoming_show_date(self):
+        """A YYYY-MM-DD term finds venues and artists with a show that day"""
+        day = (date.today() + timedelta(days=30)).isoformat()
+        with app.app_context():
+            rows = search_documents(day, 1, 1000000)
+        found = {(row.kind, row.entity_id) for row in rows}
+        self.assertIn(('venue', self.venue_id), found)
+        self.assertIn(('artist', self.artist_id), found)
+
+    def test_search_takes_wildcards_literally(self):
+        """% and _ in a term match themselves, not every name"""
+        with app.app_context():
+            for term in ('%', '_'):
+                with self.subTest(term=term):
+                    self.assertEqual(search_documents(term, 1, 10), [])
+
+    def test_search_pages_without_counting(self):
+        """A full page reports a lower bound and links the next page"""
+        app.config['SEARCH_PER_PAGE'], per_page = 1, app.config['SEARCH_PER_PAGE']
+        try:
+            res = self.client().get('/search?q=query+plan')
+        finally:
+            app.config['SEARCH_PER_PAGE'] = per_page
+        self.assertIn(b'1+', res.data)
+        self.assertIn(b'page=2', res.data)
+
+    def test_search_rejects_unknown_type(self):
+        """Only venues and artists can be searched"""
+        res = self.client().get('/search?q=query&type=show')
+        self.assertEqual(res.status_code, 400)
+
+
+class FeedTestCase(QueryBudgetAssertions, ShowFixtureTestCase):
+    """Checks the iCal and JSON schedule feeds"""
+
+    def test_feeds_list_upcoming_shows_only(self):
+        """Feeds hold the upcoming show but not the past one"""
+        res = self.client().get(f'/venues/{self.venue_id}/shows.ics')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'text/calendar')
+        self.assertEqual(res.data.count(b'BEGIN:VEVENT'), 1)
+        self.assertIn(b'SUMMARY:Query Plan Artist at Query Plan Venue', res.data)
+        res = self.client().get(f'/artists/{self.artist_id}/shows.json')
+        self.assertEqual(len(res.get_json()['shows']), 1)
+
+    def test_unchanged_feed_is_not_queried(self):
+        """A matching If-None-Match gets a 304 after a single lookup"""
+        path = f'/artists/{self.artist_id}/shows.ics'
+        etag = self.client().get(path).headers['ETag']
+        with self.assertMaxQueries(1):
+            res = self.client().get(path, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+
+    def test_new_show_changes_etag(self):
+        """Adding a show to the venue changes its feed's ETag"""
+        path = f'/venues/{self.venue_id}/shows.ics'
+        etag = self.client().get(path).headers['ETag']
+        with app.app_context():
+            show = Shows(venue_id=self.venue_id, artist_id=self.artist_id,
+                         start_time=start_of_today() + timedelta(days=60))
+            db.session.add(show)
+            add_show_counts(show, start_of_today())
+            db.session.commit()
+        res = self.client().get(path, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_venue_edit_changes_etag(self):
+        """Moving the venue changes the location in its feed, and its ETag"""
+        path = f'/venues/{self.venue_id}/shows.ics'
+        etag = self.client().get(path).headers['ETag']
+        self.client().post(f'/venues/{self.venue_id}/edit', data={
+            'name': 'Query Plan Venue', 'city': 'Oakland', 'state': 'CA',
+            'genres': [GENRE]})
+        res = self.client().get(path, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'LOCATION:Oakland\\, CA', res.data)
+
+    def test_reconcile_keeps_etag_unless_shows_changed(self):
+        """Rebuilding the counters only changes the ETags of changed entities"""
+        path = f'/venues/{self.venue_id}/shows.ics'
+
+        def reconcile():
+            with app.app_context():
+                reconcile_show_counts(start_of_today())
+                db.session.commit()
+
+        # the fixture's shows were added without their counters
+        reconcile()
+        etag = self.client().get(path).headers['ETag']
+        reconcile()
+        res = self.client().get(path, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        with app.app_context():
+            db.session.add(Shows(venue_id=self.venue_id, artist_id=self.artist_id,
+                                 start_time=start_of_today() + timedelta(days=60)))
+            db.session.commit()
+        reconcile()
+        res = self.client().get(path, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+
+
+class DeleteTestCase(QueryBudgetAssertions, ShowFixtureTestCase):
+    """Checks venues and artists are deleted with set-based statements"""
+
+    def shows_left(self):
+        # shows of the fixture venue or artist still in the database
+        with app.app_context():
+            return Shows.query.filter(
+                (Shows.venue_id == self.venue_id) |
+                (Shows.artist_id == self.artist_id)).count()
+
+    def test_delete_venue_cascades_to_shows(self):
+        """Deleting a venue removes its shows and updates the artist"""
+        def artist_counts():
+            with app.app_context():
+                return db.session.query(
+                    Artist.upcoming_shows_count, Artist.past_shows_count
+                ).filter(Artist.id == self.artist_id).one()
+
+        upcoming, past = artist_counts()
+        with self.assertMaxQueries(6):
+            res = self.client().delete(f'/venues/{self.venue_id}')
+        self.assertEqual(res.get_json(), {'success': True})
+        self.assertEqual(self.shows_left(), 0)
+        self.assertEqual(tuple(artist_counts()), (upcoming - 1, past - 1))
+
+    def test_bulk_delete_artists(self):
+        """DELETE /artists removes every listed artist that exists"""
+        res = self.client().delete('/artists', json={
+            'ids': [self.artist_id, 0]})
+        self.assertEqual(res.get_json(), {'success': True,
+                                          'deleted': [self.artist_id]})
+        self.assertEqual(self.shows_left(), 0)
+
+    def test_bulk_delete_venues(self):
+        """DELETE /venues runs as few statements as a single delete"""
+        with self.assertMaxQueries(6):
+            res = self.client().delete('/venues', json={'ids': [self.venue_id]})
+        self.assertEqual(res.get_json(), {'success': True,
+                                          'deleted': [self.venue_id]})
+        self.assertEqual(self.shows_left(), 0)
+
+    def test_bulk_delete_rejects_bad_ids(self):
+        """The body must be a non-empty list of integer ids"""
+        for body in ({}, {'ids': []}, {'ids': ['1']}, [self.venue_id]):
+            with self.subTest(body=body):
+                res = self.client().delete('/venues', json=body)
+                self.assertEqual(res.status_code, 400)
+
+
+class AvailabilityTestCase(QueryBudgetAssertions, ShowFixtureTestCase):
+    """Checks free venues and artists are found and double-bookings rejected"""
+
+    def available_names(self, days):
+        # names of the free venues and artists in the fixture's city
+        with self.assertMaxQueries(2):
+            res = self.client().get('/availability.json', query_string={
+                'date': (date.today() + timedelta(days=days)).isoformat(),
+                'city': 'San Francisco', 'state': 'CA'})
+        data = res.get_json()
+        return [[row['name'] for row in data[kind]['data']]
+                for kind in ('venues', 'artists')]
+
+    def test_booked_day_is_not_available(self):
+        """The venue and artist are free the day after their show only"""
+        venues, artists = self.available_names(30)
+        self.assertNotIn('Query Plan Venue', venues)
+        self.assertNotIn('Query Plan Artist', artists)
+        venues, artists = self.available_names(31)
+        self.assertIn('Query Plan Venue', venues)
+        self.assertIn('Query Plan Artist', artists)
+
+    def test_double_booking_is_rejected(self):
+        """A show overlapping another show of the venue is not listed"""
+        start = datetime.combine(date.today() + timedelta(days=30), time(1))
+        res = self.client().post('/shows/create', data={
+            'venue_id': self.venue_id, 'artist_id': self.artist_id,
+            'start_time': start.isoformat()})
+        self.assertIn(b'already has a show at that time', res.data)
+        with app.app_context():
+            self.assertEqual(Shows.query.filter_by(
+                venue_id=self.venue_id).count(), 2)
+
+    def test_double_booking_across_month_boundary_is_rejected(self):
+        """Shows in neighbouring partitions are checked against each other"""
+        # a venue and artist of their own, as the fixture's shows may fall
+        # on the boundary
+        with app.app_context():
+            venue = Venue(name='Boundary Venue', city='San Francisco',
+                          state='CA', genres=[GENRE])
+            artist = Artist(name='Boundary Artist', city='San Francisco',
+                            state='CA', genres=[GENRE])
+            db.session.add_all([venue, artist])
+            db.session.commit()
+            venue_id, artist_id = venue.id, artist.id
+        self.addCleanup(self.delete_entities, venue_id, artist_id)
+        today = date.today()
+        boundary = datetime(today.year + today.month // 12,
+                            today.month % 12 + 1, 1, tzinfo=timezone.utc)
+        responses = [self.client().post('/shows/create', data={
+            'venue_id': venue_id, 'artist_id': artist_id,
+            'start_time': start.isoformat()})
+            for start in (boundary - timedelta(hours=1),
+                          boundary + timedelta(hours=1))]
+        self.assertIn(b'Show was successfully listed', responses[0].data)
+        self.assertIn(b'already has a show at that time', responses[1].data)
+        with app.app_context():
+            self.assertEqual(Shows.query.filter_by(
+                venue_id=venue_id).count(), 1)
+
+    def delete_entities(self, venue_id, artist_id):
+        # remove a venue and an artist created by a test, with their shows
+        with app.app_context():
+            Shows.query.filter_by(venue_id=venue_id).delete()
+            Venue.query.filter_by(id=venue_id).delete()
+            Artist.query.filter_by(id=artist_id).delete()
+            db.session.commit()
+
+
+class ReplicaRoutingTestCase(unittest.TestCase):
+    """Checks reads are routed to the replica bind and writes to the primary"""
+
+    def setUp(self):
+        """Add a replica engine and count the statements of each engine."""
+        self.client = app.test_client()
+        self.window = app.config['REPLICA_READ_YOUR_WRITES_WINDOW']
+        with app.app_context():
+            # a second engine on the same database stands in for the replica
+            self.primary = db.engines[None]
+            self.replica = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+            db.engines['replica'] = self.replica
+        self.statements = {self.primary: 0, self.replica: 0}
+        for engine in self.statements:
+            event.listen(engine, 'before_cursor_execute', self.count_statement)
+
+    def count_statement(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        self.statements[conn.engine] += 1
+
+    def test_listing_reads_from_replica(self):
+        """GET listings only query the replica"""
+        res = self.client.get('/venues')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(self.statements[self.replica])
+        self.assertEqual(self.statements[self.primary], 0)
+
+    def test_reads_stay_on_primary_after_write(self):
+        """Reads right after a form submit go to the primary"""
+        res = self.client.post('/venues/create', data={
+            'name': 'Replica Test Venue', 'city': 'San Francisco',
+            'state': 'CA', 'address': '1 Main St', 'genres': ['Jazz']})
+        self.assertEqual(res.status_code, 200)
+        written = self.statements[self.primary]
+        res = self.client.get('/venues')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(written)
+        self.assertGreater(self.statements[self.primary], written)
+        self.assertEqual(self.statements[self.replica], 0)
+
+    def test_reads_return_to_replica_after_window(self):
+        """Reads go back to the replica once the window has passed"""
+        app.config['REPLICA_READ_YOUR_WRITES_WINDOW'] = 0
+        self.client.post('/venues/create', data={
+            'name': 'Replica Test Venue', 'city': 'San Francisco',
+            'state': 'CA', 'address': '1 Main St', 'genres': ['Jazz']})
+        res = self.client.get('/venues')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(self.statements[self.replica])
+
+    def test_failed_write_does_not_pin_to_primary(self):
+        """A rejected submission does not start the read-your-writes window"""
+        self.client.post('/shows/create', data={
+            'venue_id': 0, 'artist_id': 0, 'start_time': '2030-01-01 20:00'})
+        res = self.client.get('/venues')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(self.statements[self.replica])
+
+    def test_uncached_detail_page_reads_from_replica(self):
+        """Without a page cache, detail pages are not pinned to the primary"""
+        with app.app_context():
+            venue = Venue(name='Replica Test Venue', city='San Francisco',
+                          state='CA', address='1 Main St', genres=['Jazz'])
+            db.session.add(venue)
+            db.session.commit()
+            venue_id = venue.id
+        self.statements = dict.fromkeys(self.statements, 0)
+        cache, app.extensions['page_cache'] = (
+            app.extensions['page_cache'], NullCache())
+        try:
+            res = self.client.get(f'/venues/{venue_id}')
+        finally:
+            app.extensions['page_cache'] = cache
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(self.statements[self.replica])
+        self.assertEqual(self.statements[self.primary], 0)
+
+    def test_cached_page_is_not_rendered_from_lagging_replica(self):
+        """The page cached after an edit shows the edit, whatever the lag"""
+        app.config['REPLICA_READ_YOUR_WRITES_WINDOW'] = 0
+        with app.app_context():
+            venue = Venue(name='Replica Stale Venue', city='San Francisco',
+                          state='CA', address='1 Main St', genres=['Jazz'])
+            db.session.add(venue)
+            db.session.commit()
+            venue_id = venue.id
+        # a replica stuck on a snapshot taken before the edit
+        lagging = create_engine(app.config['SQLALCHEMY_DATABASE_URI'],
+                                poolclass=StaticPool,
+                                isolation_level='REPEATABLE READ')
+        snapshot = lagging.connect()
+        snapshot.begin()
+        snapshot.execute(text('SELECT count(*) FROM "Venue"'))
+        with app.app_context():
+            db.engines['replica'] = lagging
+        self.client.post(f'/venues/{venue_id}/edit', data={
+            'name': 'Replica Test Venue', 'city': 'San Francisco',
+            'state': 'CA', 'address': '1 Main St', 'genres': ['Jazz']})
+        # another visitor fills the cache, then reads from it
+        for _ in range(2):
+            res = app.test_client().get(f'/venues/{venue_id}')
+            self.assertIn(b'Replica Test Venue', res.data)
+        snapshot.close()
+        lagging.dispose()
+
+    def tearDown(self):
+        """Remove the replica engine and the rows created by the tests."""
+        app.config['REPLICA_READ_YOUR_WRITES_WINDOW'] = self.window
+        for engine in self.statements:
+            event.remove(engine, 'before_cursor_execute', self.count_statement)
+        with app.app_context():
+            del db.engines['replica']
+            Venue.query.filter_by(name='Replica Test Venue').delete()
+            db.session.commit()
+        self.replica.dispose()
+
+
+class BulkImportTestCase(ShowFixtureTestCase):
+    """Checks imported rows are validated like the forms and rejected rows
+    are reported"""
+
+    def import_rows(self, kind, rows):
+        # (inserted, rejected, errors) of importing rows, rolled back after
+        errors = []
+        with app.app_context():
+            try:
+                inserted, rejected = import_rows(
+                    kind, rows, 2, lambda line, message: errors.append(line))
+            finally:
+                db.session.rollback()
+        return inserted, rejected, errors
+
+    def test_non_string_values_are_read_as_text(self):
+        """NDJSON numbers and booleans are converted or the row rejected"""
+        artist = {'name': 'Bulk Import Artist', 'city': 'San Francisco',
+                  'state': 'CA', 'genres': ['Jazz']}
+        rows = [dict(artist, seeking_venue=1, phone=4155550100),
+                dict(artist, seeking_venue=True),
+                dict(artist, facebook_link=5),
+                dict(artist, city={'name': 'San Francisco'}),
+                ['Bulk Import Artist']]
+        self.assertEqual(self.import_rows('artists', rows), (2, 3, [3, 4, 5]))
+
+    def test_double_booked_shows_are_rejected(self):
+        """Shows overlapping a stored or an imported show are skipped"""
+        def show(days, hours):
+            start = start_of_today() + timedelta(days=days, hours=hours)
+            return {'venue_id': self.venue_id, 'artist_id': self.artist_id,
+                    'start_time': start.strftime('%Y-%m-%d %H:%M:%S')}
+
+        # a batch with a conflict, then one conflicting with the first batch
+        rows = [show(30, 1), show(40, 0), show(40, 2)]
+        self.assertEqual(self.import_rows('shows', rows), (1, 2, [1, 3]))
+
+
+class MinifyJsTestCase(unittest.TestCase):
+    """Checks minify_js only drops comments and whitespace"""
+
+    def test_static_scripts(self):
+        """script.js and plugins.js keep every line of code"""
+        for name in ('script.js', 'plugins.js'):
+            with self.subTest(script=name):
+                with open(os.path.join(app.static_folder, 'js', name),
+                          encoding='utf-8') as f:
+                    source = f.read()
+                # neither script has // inside a string or regex
+                lines = [re.sub(r'\s*//.*', '', line).strip()
+                         for line in source.splitlines()]
+                minified = minify_js(source)
+                self.assertEqual(minified, '\n'.join(filter(None, lines)))
+                self.assertEqual(minify_js(minified), minified)
+
+    def test_literals_are_kept(self):
+        """Comment markers and whitespace inside literals are not touched"""
+        for js in ("var a = '//  not a comment';",
+                   'var b = "/* nor this */";',
+                   'var c = `line one\n    // line two`;',
+                   "var d = 'it\\'s  //';",
+                   'var e = /https?:\\/\\//.test(url);'):
+            with self.subTest(js=js):
+                self.assertEqual(minify_js(js), js)
+
+    def test_comments_and_whitespace(self):
+        """Comments go, and line breaks stay for semicolon insertion"""
+        for js, minified in (
+                ('a = b  // note\n\n\n    c()', 'a = b\nc()'),
+                ('a = b /* note */ + c', 'a = b + c'),
+                ('a = b /* one\ntwo */ c = d', 'a = b\nc = d'),
+                ('return\n  value', 'return\nvalue'),
+                ('x = 1\r\n\ty = 2 /* unterminated', 'x = 1\ny = 2')):
+            with self.subTest(js=js):
+                self.assertEqual(minify_js(js), minified)
+
+
+class PageCacheTestCase(unittest.TestCase):
+    """Checks both page cache backends evict, expire and invalidate pages"""
+
+    def setUp(self):
+        """Create a directory for the filesystem cache."""
+        self.directory = tempfile.TemporaryDirectory()
+
+    def caches(self, max_entries=2, ttl=60):
+        # a (name, cache, age) triple per backend. age(key, seconds) makes
+        # key look last used that long ago; the memory cache keeps its use
+        # order itself
+        file_cache = FileSystemCache(self.directory.name, max_entries, ttl)
+        file_cache.clear()
+
+        def age_file(key, seconds):
+            used = os.path.getmtime(file_cache._path(key)) - seconds
+            os.utime(file_cache._path(key), (used, used))
+
+        return [('memory', MemoryCache(max_entries, ttl), lambda *_: None),
+                ('filesystem', file_cache, age_file)]
+
+    def test_least_recently_used_page_is_evicted(self):
+        for name, cache, age in self.caches():
+            with self.subTest(cache=name):
+                cache.set('a', 'page a')
+                cache.set('b', 'page b')
+                age('a', 20)
+                age('b', 10)
+                # reading a makes b the least recently used
+                self.assertEqual(cache.get('a'), 'page a')
+                cache.set('c', 'page c')
+                self.assertIsNone(cache.get('b'))
+                self.assertEqual(cache.get('a'), 'page a')
+                self.assertEqual(cache.get('c'), 'page c')
+
+    def test_expired_page_is_a_miss(self):
+        for name, cache, _ in self.caches(ttl=-1):
+            with self.subTest(cache=name):
+                cache.set('a', 'page a')
+                self.assertIsNone(cache.get('a'))
+        for name, cache, _ in self.caches(ttl=60):
+            with self.subTest(cache=name):
+                cache.set('a', 'page a')
+                self.assertEqual(cache.get('a'), 'page a')
+
+    def test_delete_and_clear_invalidate_pages(self):
+        for name, cache, _ in self.caches():
+            with self.subTest(cache=name):
+                cache.set('a', 'page a')
+                cache.set('b', 'page b')
+                cache.delete('a')
+                cache.delete('missing')
+                self.assertIsNone(cache.get('a'))
+                self.assertEqual(cache.get('b'), 'page b')
+                cache.clear()
+                self.assertIsNone(cache.get('b'))
+
+    def tearDown(self):
+        """Remove the filesystem cache directory."""
+        self.directory.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
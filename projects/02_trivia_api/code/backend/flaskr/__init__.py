@@ -5,6 +5,7 @@ from flask_cors import CORS
 import random
 
 from models import setup_db, Question, Category
+from query_budget import init_query_budget
 
 # define questions per page
 QUESTIONS_PER_PAGE = 10
@@ -14,6 +15,8 @@ def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
     setup_db(app)
+    # log requests issuing too many or repeated (N+1) queries
+    init_query_budget(app)
 
     CORS(app, resources={r'*': {'origins': '*'}})
 
@@ -6,9 +6,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flaskr import create_app
 from models import setup_db, Question, Category
 from dbparams import dbparams
+from query_budget import QueryBudgetAssertions
 
 
-class TriviaTestCase(unittest.TestCase):
+class TriviaTestCase(QueryBudgetAssertions, unittest.TestCase):
     """This class represents the trivia test case"""
 
     def setUp(self):
@@ -163,6 +164,13 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'resource not found')
 
+    def test_get_questions_query_budget(self):
+        """Test a page of questions is fetched without per-row queries"""
+        with self.assertMaxQueries(2):
+            res = self.client().get('/questions')
+
+        self.assertEqual(res.status_code, 200)
+
     def tearDown(self):
         """Executed after reach test"""
         pass
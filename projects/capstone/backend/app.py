@@ -4,6 +4,7 @@ from flask_cors import CORS
 from models import setup_db, Movie, Actor
 import datetime
 from auth import requires_auth, AuthError
+from query_budget import init_query_budget
 
 
 def create_app(test_config=None):
@@ -13,6 +14,8 @@ def create_app(test_config=None):
     # allow connections from all origins
     CORS(app, resources={r'*': {'origins': '*'}})
     setup_db(app)
+    # log requests issuing too many or repeated (N+1) queries
+    init_query_budget(app)
 
     @app.after_request
     def after_request(response):
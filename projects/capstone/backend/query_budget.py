@@ -0,0 +1,142 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ----------------------------------------------------------------------------#
+# Per-request query budget and N+1 detection.
+# ----------------------------------------------------------------------------#
+
+# defaults for apps whose config does not set them
+DEFAULT_QUERY_BUDGET = 10
+DEFAULT_REPEAT_THRESHOLD = 5
+
+# longest statement shape sent in a debug header
+HEADER_SHAPE_LENGTH = 200
+
+
+def statement_shape(statement):
+    # the statement with literals, parameters and IN lists collapsed, so
+    # the same query run for different rows has the same shape
+    shape = re.sub(r'\s+', ' ', statement).strip()
+    shape = re.sub(r"'(?:[^']|'')*'", '?', shape)
+    shape = re.sub(r'%\(\w+\)s|%s|\b\d+\b', '?', shape)
+    return re.sub(r'\(\?(?:, \?)*\)', '(?)', shape)
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    # count every statement sent to the database during a request, by shape
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        g.setdefault('query_shapes', Counter())[statement_shape(statement)] += 1
+        # kept on the statement's own context, so a failed statement leaves
+        # nothing behind to skew the next timing
+        if context is not None:
+            context.query_started = time.perf_counter()
+
+
+def time_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    if has_request_context() and started is not None:
+        g.query_time = g.get('query_time', 0) + time.perf_counter() - started
+
+
+def repeated_queries(shapes, threshold):
+    # (count, shape) of statements run at least threshold times, most first:
+    # usually a query issued once per row of an earlier one (N+1)
+    return sorted(((count, shape) for shape, count in shapes.items()
+                   if count >= threshold), reverse=True)
+
+
+def query_budget(max_queries):
+    # decorator overriding the default QUERY_BUDGET for a single view
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            g.query_budget = max_queries
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def check_query_budget(response):
+    # warn when a request issued more queries than its budget allows, or
+    # repeated a statement; in debug mode also report both in headers.
+    # Queries run while a streamed response is sent are not included
+    config = current_app.config
+    budget = g.get('query_budget', config.get('QUERY_BUDGET'))
+    query_count = g.get('query_count', 0)
+    if budget is not None and query_count > budget:
+        current_app.logger.warning(
+            '%s %s issued %d queries (budget %d)',
+            request.method, request.path, query_count, budget)
+    repeated = repeated_queries(g.get('query_shapes', {}),
+                                config['QUERY_REPEAT_THRESHOLD'])
+    for count, shape in repeated:
+        current_app.logger.warning(
+            '%s %s ran the same statement %d times, possible N+1: %s',
+            request.method, request.path, count, shape)
+    if current_app.debug or config['QUERY_DEBUG_HEADERS']:
+        response.headers['X-Query-Count'] = str(query_count)
+        response.headers['X-Query-Time-Ms'] = f"{g.get('query_time', 0) * 1000:.1f}"
+        if budget is not None:
+            response.headers['X-Query-Budget'] = str(budget)
+        for count, shape in repeated:
+            response.headers.add('X-Query-Repeated',
+                                 f'{count}x {shape[:HEADER_SHAPE_LENGTH]}')
+    return response
+
+
+def init_query_budget(app):
+    # listen on every engine so all binds are counted
+    app.config.setdefault('QUERY_BUDGET', DEFAULT_QUERY_BUDGET)
+    app.config.setdefault('QUERY_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+    app.config.setdefault('QUERY_DEBUG_HEADERS', False)
+    if not event.contains(Engine, 'before_cursor_execute', count_query):
+        event.listen(Engine, 'before_cursor_execute', count_query)
+        event.listen(Engine, 'after_cursor_execute', time_query)
+    app.after_request(check_query_budget)
+
+
+# ----------------------------------------------------------------------------#
+# Test helpers.
+# ----------------------------------------------------------------------------#
+
+
+@contextmanager
+def capture_queries():
+    # every statement sent to any engine inside the block
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters,
+                              context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'before_cursor_execute', before_cursor_execute)
+
+
+class QueryBudgetAssertions:
+    # unittest.TestCase mixin
+
+    @contextmanager
+    def assertMaxQueries(self, max_queries, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """Fail if the block issues more than max_queries statements, or
+        runs the same statement threshold times or more."""
+        with capture_queries() as statements:
+            yield statements
+        shapes = Counter(statement_shape(statement) for statement in statements)
+        repeated = repeated_queries(shapes, threshold)
+        details = ''.join(f'\n  {count}x {shape}' for count, shape in repeated)
+        if len(statements) > max_queries:
+            self.fail(f'{len(statements)} queries issued, budget {max_queries}'
+                      f'{details}')
+        if repeated:
+            self.fail(f'statements repeated, possible N+1:{details}')
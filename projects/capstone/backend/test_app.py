@@ -6,9 +6,10 @@ from flask_sqlalchemy import SQLAlchemy
 from app import create_app
 from models import setup_db, Actor, Movie
 from settings import *
+from query_budget import QueryBudgetAssertions
 
 
-class CastingAgencyTestCase(unittest.TestCase):
+class CastingAgencyTestCase(QueryBudgetAssertions, unittest.TestCase):
     """This class represents the capstone test case"""
 
     def setUp(self):
@@ -274,6 +275,15 @@ class CastingAgencyTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data['message'], 'bad request')
 
+    def test_get_movies_and_actors_query_budget(self):
+        """Test listings are fetched without per-row queries"""
+        for path in ('/movies', '/actors'):
+            with self.subTest(path=path), self.assertMaxQueries(1):
+                res = self.client().get(
+                    path, headers={'Authorization': f'Bearer {executive_producer_auth}'})
+
+            self.assertEqual(res.status_code, 200)
+
     def tearDown(self):
         """Executed after reach test"""
         pass